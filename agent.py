@@ -0,0 +1,428 @@
+"""Agent executor for the multi-agent system prompt in assistant.py.
+
+Each model reply is one step of the Output JSON Format. A step naming a
+`function` (or a list of `calls`) is dispatched to the registered tool(s)
+and the results are sent back as `{"step": "observe", "output": ...}`;
+a step of `"output"` ends the turn with its `content` as the reply.
+
+The tools the model almost always asks for first do not depend on its
+reasoning, so they are started speculatively as soon as the user message
+arrives: emotion detection, and question generation followed by vector
+search, run concurrently while the model plans. When the model then
+requests them with the same arguments, the result is already there (or in
+flight), so a turn costs the critical path rather than the sum of steps.
+Independent calls requested in one step also run concurrently.
+
+Speculation spends LLM calls the model may never ask for, so it is opt-in
+(AGENT_PREFETCH) and skipped for short messages. Unused calls cannot be
+stopped once their thread runs; run turns on one long-lived event loop so
+a turn does not wait for them.
+"""
+import asyncio
+import inspect
+import json
+import re
+import time
+from dataclasses import dataclass, field
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from assistant import client, emotion_detection, system_prompt
+from config import (
+    AGENT_MAX_STEPS,
+    AGENT_MODEL,
+    AGENT_PREFETCH,
+    AGENT_PREFETCH_MIN_WORDS,
+    COLLECTION_NAME,
+    RETRIEVAL_K,
+)
+from context_packing import pack_context
+from emotion_classifier import CRISIS_TEXT, is_crisis
+from memory import ConversationMemory, llm_summarizer
+from metrics import stage
+from retrieval import embed_queries, generate_questions, reciprocal_rank_fusion, search_batch
+
+
+COMBINE_TEMPLATE = """You are a supportive mental health assistant. You are an AI, not a healthcare professional.
+
+User message: {query}
+
+Emotional analysis: {emotion}
+
+Relevant resources:
+{context}
+
+Write an empathetic, personalised reply that matches the user's emotional needs.
+Use the resources for practical, evidence-based suggestions, do not promise
+outcomes or make medical claims, and recommend professional help for serious concerns.
+
+Answer:"""
+
+CRISIS_RESOURCES = [
+    "If you are in immediate danger, call your local emergency number (911 in the US, 999 in the UK, 112 in the EU).",
+    "US: call or text 988 (Suicide & Crisis Lifeline), or text HOME to 741741 (Crisis Text Line).",
+    "UK and Ireland: call Samaritans on 116 123.",
+    "Elsewhere: find a helpline at https://findahelpline.com.",
+]
+
+# Characters of each retrieved document shown to the planning model
+OBSERVED_DOC_CHARS = 500
+
+
+class StepError(ValueError):
+    """A model reply that is not a usable step"""
+
+
+class ToolInputError(ValueError):
+    """A tool argument of the wrong type"""
+
+
+def parse_step(text):
+    """The step object in a model reply (code fences tolerated)"""
+    text = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", text or "")
+    try:
+        step = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise StepError(f"reply is not valid JSON: {e}") from None
+    if not isinstance(step, dict):
+        raise StepError("reply is not a JSON object")
+    return step
+
+
+def step_calls(step):
+    """(function, input) pairs requested by a step, in order"""
+    calls = step.get("calls") or []
+    if step.get("function"):
+        calls = [{"function": step["function"], "input": step.get("input")}, *calls]
+
+    requested = []
+    for call in calls:
+        if not isinstance(call, dict) or not isinstance(call.get("function"), str):
+            raise StepError(f"malformed call: {call!r}")
+        arguments = call.get("input") or {}
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except json.JSONDecodeError:
+                raise StepError(f"input of {call['function']} is not a JSON object") from None
+        if not isinstance(arguments, dict):
+            raise StepError(f"input of {call['function']} is not a JSON object")
+        requested.append((call["function"], arguments))
+    return requested
+
+
+@dataclass
+class ToolTiming:
+    name: str
+    seconds: float
+    # Started before the model asked for it
+    speculative: bool = False
+    # The model never asked for it (a speculative call that went unused)
+    used: bool = True
+
+
+@dataclass
+class Turn:
+    """One user message: the reply and where the time went"""
+
+    user_input: str
+    answer: str = ""
+    steps: int = 0
+    llm_seconds: float = 0.0
+    # Prompt size of the turn's first model call: fixed prefix, history and the
+    # user message (provider-reported when available, otherwise estimated)
+    prompt_tokens: int = 0
+    history_tokens: int = 0
+    stopped: str = "output"
+    tools: list = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+    # Latest result of each tool, used as defaults for later calls
+    results: dict = field(default_factory=dict)
+    docs: list = field(default_factory=list)
+
+    @property
+    def tool_seconds(self):
+        """Summed tool time; more than the wall time they took when they overlap"""
+        return sum(timing.seconds for timing in self.tools if timing.used)
+
+    def summary(self):
+        tools = ", ".join(
+            f"{t.name} {t.seconds:.2f}s{' (prefetched)' if t.speculative else ''}"
+            for t in self.tools if t.used
+        )
+        return (
+            f"⏱️ Turn: {self.elapsed:.2f}s total, {self.steps} agent steps ({self.llm_seconds:.2f}s in the model), "
+            f"tools {self.tool_seconds:.2f}s summed [{tools or 'none'}], "
+            f"prompt {self.prompt_tokens} tokens ({self.history_tokens} history)"
+            + ("" if self.stopped == "output" else f", stopped: {self.stopped}")
+        )
+
+
+class AgentExecutor:
+    """Run the step loop of assistant.system_prompt against registered tools"""
+
+    def __init__(
+        self,
+        client,
+        system_prompt,
+        tools,
+        model=AGENT_MODEL,
+        max_steps=AGENT_MAX_STEPS,
+        prefetch=AGENT_PREFETCH,
+        prefetch_min_words=AGENT_PREFETCH_MIN_WORDS,
+        memory=None,
+    ):
+        self.client = client
+        self.tools = tools
+        self.model = model
+        self.max_steps = max_steps
+        self.prefetch = prefetch
+        self.prefetch_min_words = prefetch_min_words
+        self.memory = memory or ConversationMemory(
+            [{"role": "system", "content": system_prompt}], summarizer=llm_summarizer(client, model)
+        )
+
+    async def run_turn(self, user_input):
+        """Answer one user message, keeping the conversation for the next one"""
+        turn = Turn(user_input)
+        calls = {}
+        # A greeting is answered directly; speculating on it only wastes calls
+        if self.prefetch and len(user_input.split()) >= self.prefetch_min_words:
+            self._prefetch(turn, calls)
+
+        messages = [*self.memory.messages(), {"role": "user", "content": user_input}]
+        turn.history_tokens = self.memory.history_tokens()
+        turn.prompt_tokens = self.memory.prompt_tokens(user_input)
+        try:
+            with stage("agent_turn") as fields:
+                await self._loop(turn, calls, messages)
+                fields["steps"] = turn.steps
+                fields["history_tokens"] = turn.history_tokens
+        finally:
+            for task, _ in calls.values():
+                task.cancel()
+
+        turn.answer = self._with_safety(turn, turn.answer)
+        turn.elapsed = time.perf_counter() - turn.started
+        # Only the user message and the final reply are remembered, not the tool steps
+        self.memory.add_turn(user_input, json.dumps({"step": "output", "content": turn.answer}))
+        return turn
+
+    async def _loop(self, turn, calls, messages):
+        for _ in range(self.max_steps):
+            reply = await self._complete(turn, messages)
+            messages.append({"role": "assistant", "content": reply})
+            try:
+                step = parse_step(reply)
+                requested = step_calls(step)
+            except StepError as e:
+                messages.append(_observation({"error": f"{e}; reply with one step in the Output JSON Format"}))
+                continue
+
+            if not requested:
+                if step.get("step") == "output":
+                    turn.answer = str(step.get("content", ""))
+                    return
+                messages.append(_observation({"error": "no function to call; continue, or reply with step \"output\""}))
+                continue
+
+            outputs = await asyncio.gather(*(
+                self._dispatch(turn, calls, name, arguments) for name, arguments in requested
+            ))
+            output = outputs[0] if len(outputs) == 1 else [
+                {"function": name, "output": result} for (name, _), result in zip(requested, outputs)
+            ]
+            messages.append(_observation(output))
+
+        # Out of steps: answer from whatever the tools produced so far
+        turn.stopped = f"step cap ({self.max_steps})"
+        await asyncio.gather(*(asyncio.shield(task) for task, _ in calls.values()), return_exceptions=True)
+        answer = await self._dispatch(turn, calls, "combine_knowledge", {})
+        turn.answer = answer if isinstance(answer, str) else (
+            "I'm sorry, I couldn't put together an answer just now. Please try again in a moment."
+        )
+
+    async def _complete(self, turn, messages):
+        start = time.perf_counter()
+        with stage("agent_step") as fields:
+            response = await asyncio.to_thread(
+                self.client.chat.completions.create,
+                model=self.model,
+                n=1,
+                response_format={"type": "json_object"},
+                messages=messages,
+            )
+            if response.usage is not None:
+                fields["prompt_tokens"] = response.usage.prompt_tokens
+                fields["completion_tokens"] = response.usage.completion_tokens
+                if not turn.steps:
+                    turn.prompt_tokens = response.usage.prompt_tokens
+        turn.steps += 1
+        turn.llm_seconds += time.perf_counter() - start
+        return response.choices[0].message.content
+
+    def _prefetch(self, turn, calls):
+        """Start the tools that only depend on the user message"""
+        self._start(turn, calls, "emotion_detect", {"text": turn.user_input}, speculative=True)
+        questions = self._start(turn, calls, "generate_questions", {"query": turn.user_input}, speculative=True)
+
+        async def search():
+            await self._start(turn, calls, "vector_search", {"questions": await questions}, speculative=True)
+
+        task = asyncio.ensure_future(search())
+        task.add_done_callback(_consume_exception)
+        calls["prefetch:vector_search"] = (task, ToolTiming("prefetch", 0.0, used=False))
+
+    def _start(self, turn, calls, name, arguments, speculative=False):
+        """The task computing `name(**arguments)` this turn, started if new"""
+        key = _call_key(name, arguments, turn.user_input)
+        if key in calls:
+            task, timing = calls[key]
+            timing.used = timing.used or not speculative
+            return task
+
+        timing = ToolTiming(name, 0.0, speculative=speculative, used=not speculative)
+        turn.tools.append(timing)
+        task = asyncio.ensure_future(self._run_tool(turn, name, arguments, timing))
+        task.add_done_callback(_consume_exception)
+        calls[key] = (task, timing)
+        return task
+
+    async def _run_tool(self, turn, name, arguments, timing):
+        start = time.perf_counter()
+        try:
+            with stage(f"tool:{name}"):
+                result = await asyncio.to_thread(self.tools[name], turn, **arguments)
+        finally:
+            timing.seconds = time.perf_counter() - start
+        turn.results[name] = result
+        return result
+
+    async def _dispatch(self, turn, calls, name, arguments):
+        """Run (or join) a requested call; errors become observations for the model"""
+        if name not in self.tools:
+            return {"error": f"unknown function {name!r}; available: {', '.join(self.tools)}"}
+        try:
+            inspect.signature(self.tools[name]).bind(turn, **arguments)
+        except TypeError as e:
+            return {"error": f"bad input for {name}: {e}"}
+        try:
+            return await asyncio.shield(self._start(turn, calls, name, arguments))
+        except ToolInputError as e:
+            return {"error": f"bad input for {name}: {e}"}
+        except Exception as e:
+            return {"error": f"{name} failed: {type(e).__name__}: {e}"}
+
+    def _with_safety(self, turn, answer):
+        """Crisis resources are always included when the message shows crisis risk"""
+        emotion = turn.results.get("emotion_detect") or {}
+        if not (CRISIS_TEXT.search(turn.user_input) or is_crisis(emotion)):
+            return answer
+        missing = [line for line in CRISIS_RESOURCES if line not in answer]
+        if not missing:
+            return answer
+        return answer + "\n\nIf you are thinking about harming yourself, please reach out now:\n" + "\n".join(
+            f"- {line}" for line in missing
+        )
+
+
+def _observation(output):
+    return {"role": "user", "content": json.dumps({"step": "observe", "output": output}, default=str)}
+
+
+def _consume_exception(task):
+    # Unused speculative calls may fail; that is not worth an asyncio warning
+    if not task.cancelled():
+        task.exception()
+
+
+def _call_key(name, arguments, user_input):
+    """Calls with the same meaning share one result.
+
+    The user message is every tool's default input (and vector_search always
+    searches it), so passing it explicitly or leaving it out is the same call.
+    """
+    user_input = user_input.strip()
+    normalised = {}
+    for key, value in arguments.items():
+        if isinstance(value, list) and all(isinstance(item, str) for item in value):
+            value = sorted({item.strip() for item in value} - {user_input})
+        elif isinstance(value, str):
+            value = value.strip()
+            if value == user_input:
+                value = None
+        if value not in (None, "", [], {}):
+            normalised[key] = value
+    return f"{name}:{json.dumps(normalised, sort_keys=True, default=str)}"
+
+
+def default_tools(llm, vector_store, k=RETRIEVAL_K):
+    """The tools advertised in assistant.system_prompt; each takes the Turn first"""
+    def emotion_detect(turn, text=None):
+        return emotion_detection(text or turn.user_input)
+
+    def generate_questions_tool(turn, query=None):
+        return generate_questions(query or turn.user_input, llm)
+
+    def vector_search(turn, questions=()):
+        if isinstance(questions, str):
+            questions = [questions]
+        if not isinstance(questions, (list, tuple)) or not all(isinstance(q, str) for q in questions):
+            raise ToolInputError("questions must be a list of strings")
+        queries = list(dict.fromkeys([turn.user_input, *questions]))
+        results = search_batch(vector_store, embed_queries(vector_store.embeddings, queries), k)
+        turn.docs = reciprocal_rank_fusion(results)[:k]
+        return [
+            {"content": doc.page_content[:OBSERVED_DOC_CHARS], "source": doc.metadata.get("source")}
+            for doc in turn.docs
+        ]
+
+    def combine_knowledge(turn, query=None, emotion_data=None, retrieved_docs=None):
+        # Defaults to this turn's results, so the model need not echo them back
+        emotion = emotion_data or turn.results.get("emotion_detect") or {}
+        if retrieved_docs:
+            context = "\n\n".join(
+                doc.get("content", "") if isinstance(doc, dict) else str(doc) for doc in retrieved_docs
+            )
+        else:
+            context = pack_context(turn.docs).text
+        prompt = ChatPromptTemplate.from_template(COMBINE_TEMPLATE)
+        return (prompt | llm | StrOutputParser()).invoke({
+            "query": query or turn.user_input,
+            "emotion": json.dumps(emotion),
+            "context": context or "(no resources found)",
+        })
+
+    def safety_protocol(turn, user_input=None, emotion_data=None):
+        text = user_input or turn.user_input
+        emotion = emotion_data or turn.results.get("emotion_detect") or {}
+        crisis = bool(CRISIS_TEXT.search(text)) or is_crisis(emotion)
+        return {
+            "crisis": crisis,
+            "severe": emotion.get("intensity") == "severe",
+            "resources": CRISIS_RESOURCES if crisis else [],
+        }
+
+    return {
+        "emotion_detect": emotion_detect,
+        "generate_questions": generate_questions_tool,
+        "vector_search": vector_search,
+        "combine_knowledge": combine_knowledge,
+        "safety_protocol": safety_protocol,
+    }
+
+
+def build_agent(llm=None, vector_store=None, **kwargs):
+    """Agent over the shared collection (seeded if new) and the Gemini chat model"""
+    from embeddings import get_embeddings
+    from rag_with_gemini import ARTICLE_URLS, get_llm, inject_documents, open_vector_store, unseeded_urls
+
+    if vector_store is None:
+        missing = unseeded_urls(ARTICLE_URLS)
+        if missing:
+            inject_documents(missing)
+        vector_store = open_vector_store(COLLECTION_NAME, get_embeddings())
+    tools = default_tools(llm or get_llm(), vector_store)
+    return AgentExecutor(kwargs.pop("client", client), system_prompt, tools, **kwargs)
@@ -0,0 +1,250 @@
+"""Score a JSONL backlog of messages with emotion detection, concurrently and resumably.
+
+    python batch_emotion.py messages.jsonl results.jsonl [--text-field text] [--id-field id]
+                            [--concurrency 16] [--rate 10] [--retries 5]
+
+Each input line is a JSON object whose text fields are joined and scored
+with the same prompt as main.emotion_detection. Results are appended to
+the output as they complete, one JSON line per message:
+
+    {"id": ..., "emotion": {...}}    or    {"id": ..., "error": "..."}
+
+The output doubles as the checkpoint: on restart, messages that already
+have a result are skipped and failed ones are tried again, so a crash or
+Ctrl-C only loses the requests that were in flight.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
+
+from config import BATCH_CONCURRENCY, BATCH_RATE_LIMIT, BATCH_RETRIES, LLM_BASE_URL
+from assistant import EMOTION_MODEL, emotion_messages
+from metrics import stage
+
+
+# Rate limiting (429), provider errors (5xx) and dropped connections are worth retrying
+RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+MAX_RETRY_DELAY = 60.0
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, in bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class BatchStats:
+    scored: int = 0
+    failed: int = 0
+    skipped: int = 0
+    retries: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        done = self.scored + self.failed
+        rate = done / self.elapsed if self.elapsed > 0 else 0.0
+        error_rate = self.failed / done if done else 0.0
+        return (
+            f"📊 {done} messages in {self.elapsed:.1f}s ({rate:.1f} msgs/s), "
+            f"{self.failed} failed ({error_rate:.1%} error rate), {self.retries} retries, "
+            f"{self.skipped} already scored"
+        )
+
+
+def load_checkpoint(path):
+    """IDs with a successful result in `path`; a partially written last line is dropped"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if "error" not in record:
+            done.add(str(record["id"]))
+    return done
+
+
+def read_messages(path, text_fields, id_field):
+    """Yield (id, text) per input line; text is None for lines that are not JSON objects"""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            if not isinstance(record, dict):
+                yield f"line-{number}", None
+                continue
+
+            message_id = str(record.get(id_field, f"line-{number}"))
+            yield message_id, "\n\n".join(str(record[name]) for name in text_fields if record.get(name))
+
+
+def _retry_delay(error, attempt, backoff=1.0):
+    """Server-provided Retry-After if any, otherwise jittered exponential backoff"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return min(float(retry_after), MAX_RETRY_DELAY)
+    except (TypeError, ValueError):
+        return min(backoff * 2 ** attempt * (0.5 + random.random()), MAX_RETRY_DELAY)
+
+
+async def score_message(client, bucket, message_id, text, retries, stats):
+    """Emotion analysis for one message, as the result record to write"""
+    if text is None:
+        return {"id": message_id, "error": "input line is not a JSON object"}
+    if not text:
+        return {"id": message_id, "error": "no text to score"}
+
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            await bucket.acquire()
+        try:
+            with stage("emotion_batch") as fields:
+                response = await client.chat.completions.create(
+                    model=EMOTION_MODEL,
+                    n=1,
+                    response_format={"type": "json_object"},
+                    messages=emotion_messages(text),
+                )
+                if response.usage is not None:
+                    fields["prompt_tokens"] = response.usage.prompt_tokens
+                    fields["completion_tokens"] = response.usage.completion_tokens
+            return {"id": message_id, "emotion": json.loads(response.choices[0].message.content)}
+        except RETRYABLE_ERRORS as e:
+            if attempt == retries:
+                return {"id": message_id, "error": f"{type(e).__name__}: {e}"}
+            stats.retries += 1
+            await asyncio.sleep(_retry_delay(e, attempt))
+        except Exception as e:
+            return {"id": message_id, "error": f"{type(e).__name__}: {e}"}
+
+
+async def score_file(
+    input_path,
+    output_path,
+    text_fields=("text",),
+    id_field="id",
+    concurrency=BATCH_CONCURRENCY,
+    rate=BATCH_RATE_LIMIT,
+    retries=BATCH_RETRIES,
+    progress_every=10.0,
+    stats=None,
+    client=None,
+):
+    """Score every message of `input_path` not yet in `output_path`; returns BatchStats"""
+    stats = stats if stats is not None else BatchStats()
+    done = load_checkpoint(output_path)
+    bucket = TokenBucket(rate) if rate > 0 else None
+    # Retries are handled here, with the rate limiter in the loop
+    client = client or AsyncOpenAI(api_key=os.getenv("API_KEY"), base_url=LLM_BASE_URL, max_retries=0)
+    # Bounded, so only a few lines of the input are held in memory
+    todo = asyncio.Queue(maxsize=concurrency * 2)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        async def worker():
+            while (item := await todo.get()) is not None:
+                record = await score_message(client, bucket, *item, retries, stats)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                if "error" in record:
+                    stats.failed += 1
+                else:
+                    stats.scored += 1
+
+        async def report():
+            while True:
+                await asyncio.sleep(progress_every)
+                print(stats.summary(), flush=True)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        reporter = asyncio.create_task(report())
+        try:
+            for message_id, text in read_messages(input_path, text_fields, id_field):
+                if message_id in done:
+                    stats.skipped += 1
+                    continue
+                await todo.put((message_id, text))
+            for _ in workers:
+                await todo.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            reporter.cancel()
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(reporter, *workers, return_exceptions=True)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file with one message per line")
+    parser.add_argument("output", help="JSONL results file, appended to and used to resume")
+    parser.add_argument("--text-field", action="append", dest="text_fields",
+                        help="field holding the message text (repeatable; default: text)")
+    parser.add_argument("--id-field", default="id", help="field identifying a message (default: id, else line number)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="max requests in flight")
+    parser.add_argument("--rate", type=float, default=BATCH_RATE_LIMIT, help="max requests per second (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=BATCH_RETRIES, help="retries per message on 429/5xx")
+    parser.add_argument("--progress-every", type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    stats = BatchStats()
+    try:
+        asyncio.run(score_file(
+            args.input,
+            args.output,
+            text_fields=args.text_fields or ["text"],
+            id_field=args.id_field,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            retries=args.retries,
+            progress_every=args.progress_every,
+            stats=stats,
+        ))
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; rerun the same command to resume from {args.output}")
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
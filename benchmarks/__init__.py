@@ -0,0 +1,15 @@
+"""Offline benchmarks; run them from the repository root, e.g. `python -m benchmarks.multi_query`"""
+import resource
+
+
+# Vocabulary of the generated documents, queries and answers
+WORDS = (
+    "stress anxiety sleep work burnout breathing exercise therapy mood support "
+    "friends family walk routine diet meditation mindfulness journal doctor "
+    "professional help crisis calm relax worry health habits time balance "
+    "feelings thoughts body rest energy focus social connection nature"
+).split()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,93 @@
+"""Per-turn latency of the agent executor, with and without speculative tool calls.
+
+    python -m benchmarks.agent_turn [--turns 5] [--first-token-ms 300] [--max-steps 8] [--memory-budget 2000]
+
+Runs agent.AgentExecutor against the local stand-ins. The fake model
+follows the system prompt one tool at a time (emotion_detect,
+generate_questions, vector_search, safety_protocol, combine_knowledge,
+output). With prefetching, the user-message-only tools start while the
+model plans, so their time is hidden behind its round trips.
+
+Each mode is one session, so the prompt tokens per turn show the
+conversation memory at work: they grow until the history reaches its
+budget, then stay flat as older turns are folded into the summary.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+
+from benchmarks.run import QUERIES, configure_environment
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5, help="user messages per mode")
+    parser.add_argument("--pages", type=int, default=10, help="fixture pages ingested before the test")
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=2)
+    parser.add_argument("--max-steps", type=int, default=8)
+    parser.add_argument("--memory-budget", type=int, default=None, help="history token budget (default: config)")
+    parser.add_argument("--backend", choices=["qdrant", "local"], default="qdrant")
+    args = parser.parse_args()
+
+    from benchmarks.standins import FakeChatServer, FixtureSite, HashEmbeddings, OpenAICompatibleChat
+
+    chat = FakeChatServer(first_token_latency=args.first_token_ms / 1000, token_latency=args.token_ms / 1000).start()
+    site = FixtureSite().start()
+    args.llm_base_url = chat.base_url
+    configure_environment(args, tempfile.mkdtemp(prefix="bench_agent_"))
+
+    from openai import OpenAI
+
+    from agent import build_agent
+    from config import CACHE_DIR, COLLECTION_NAME, MEMORY_TOKEN_BUDGET
+    from embeddings import CachedEmbeddings, EmbeddingCache, get_embeddings, set_embeddings
+    from assistant import system_prompt
+    from memory import ConversationMemory, llm_summarizer
+    from rag_with_gemini import inject_documents, open_vector_store
+
+    set_embeddings(CachedEmbeddings(
+        HashEmbeddings(), "hash-384", EmbeddingCache(os.path.join(CACHE_DIR, "embeddings.sqlite"))
+    ))
+    inject_documents(site.page_urls(args.pages))
+    vector_store = open_vector_store(COLLECTION_NAME, get_embeddings())
+    llm = OpenAICompatibleChat(base_url=chat.base_url)
+    client = OpenAI(base_url=chat.base_url, api_key="offline-benchmark")
+
+    print(f"{args.turns} turns per mode, first token {args.first_token_ms:.0f} ms, step cap {args.max_steps}\n")
+    print(f"{'mode':<12}{'mean s':>9}{'max s':>9}{'steps':>7}{'model s':>9}{'tools s':>9}{'prompt tok':>12}")
+    loop = asyncio.new_event_loop()
+    try:
+        for prefetch in (False, True):
+            memory = ConversationMemory(
+                [{"role": "system", "content": system_prompt}],
+                summarizer=llm_summarizer(client, "fake"),
+                budget=args.memory_budget or MEMORY_TOKEN_BUDGET,
+            )
+            agent = build_agent(llm=llm, vector_store=vector_store, client=client,
+                                max_steps=args.max_steps, prefetch=prefetch, memory=memory)
+            turns = []
+            for i in range(args.turns):
+                # Unique text so the query-embedding LRU cannot answer it
+                turns.append(loop.run_until_complete(agent.run_turn(f"{QUERIES[i % len(QUERIES)]} (turn {i})")))
+            elapsed = [turn.elapsed for turn in turns]
+            print(f"{'prefetch' if prefetch else 'sequential':<12}{statistics.mean(elapsed):>9.2f}{max(elapsed):>9.2f}"
+                  f"{statistics.mean(turn.steps for turn in turns):>7.1f}"
+                  f"{statistics.mean(turn.llm_seconds for turn in turns):>9.2f}"
+                  f"{statistics.mean(turn.tool_seconds for turn in turns):>9.2f}"
+                  f"{statistics.mean(turn.prompt_tokens for turn in turns):>12.0f}")
+        print(f"\nprompt tokens by turn: {', '.join(str(turn.prompt_tokens) for turn in turns)}")
+        print(f"history tokens by turn: {', '.join(str(turn.history_tokens) for turn in turns)}")
+        print(f"turns folded into the summary: {memory.folded}")
+        print(f"\nlast turn: {turns[-1].summary()}")
+    finally:
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+        chat.stop()
+        site.stop()
+
+
+if __name__ == "__main__":
+    main()
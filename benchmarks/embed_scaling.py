@@ -0,0 +1,123 @@
+"""Ingest embedding throughput from 1 to N worker processes (parallel_embeddings.py).
+
+    python -m benchmarks.embed_scaling [--workers 1,2,4,8] [--chunks 4000] [--batch-size 32]
+                                       [--model standin|huggingface] [--threads-per-worker 0]
+
+Splits generated articles into chunks the way the ingest pipeline does,
+then embeds them all with ParallelEmbeddings at each worker count and
+reports chunks/s, speedup over one worker and per-core efficiency. Pool
+start-up (a model load per worker) is timed separately. A last run at the
+highest worker count without length sorting shows what sorting saves.
+
+--model standin uses a CPU-bound stand-in whose cost grows with padded
+batch length; --model huggingface runs EMBEDDING_MODEL through
+sentence-transformers (which also sorts within each call, so the sorting
+gain there is smaller). Scaling past the number of physical cores is not
+expected.
+"""
+import argparse
+import functools
+import os
+import random
+import time
+
+import numpy as np
+
+
+def standin_model(batch_size, per_token):
+    from benchmarks.standins import HashEmbeddings
+
+    return HashEmbeddings(call_overhead=0.0, per_text=0.0, per_token=per_token, batch_size=batch_size, busy=True)
+
+
+def make_chunks(count, seed=0):
+    """Chunks of generated articles, split with the pipeline's settings"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from benchmarks import WORDS
+    from config import CHUNK_OVERLAP, CHUNK_SIZE
+
+    rng = random.Random(seed)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = []
+    while len(chunks) < count:
+        paragraphs = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 120))) + "."
+            for _ in range(rng.randint(3, 30))
+        ]
+        chunks.extend(splitter.split_text("\n\n".join(paragraphs)))
+    return chunks[:count]
+
+
+def run(factory, texts, workers, args, sort_by_length=True):
+    from parallel_embeddings import ParallelEmbeddings
+
+    engine = ParallelEmbeddings(
+        factory,
+        workers=workers,
+        threads_per_worker=args.threads_per_worker,
+        batch_size=args.batch_size,
+        min_parallel=0 if workers > 1 else len(texts) + 1,
+        sort_by_length=sort_by_length,
+    )
+    try:
+        start = time.perf_counter()
+        if workers > 1:
+            engine.start()
+        else:
+            engine.embed_documents(["warm-up"])
+        startup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectors = engine.embed_documents(texts)
+        return engine, startup, time.perf_counter() - start, np.asarray(vectors, dtype=np.float32)
+    finally:
+        engine.close()
+
+
+def main():
+    cores = os.cpu_count() or 1
+    default_levels = sorted({1, *(2 ** i for i in range(1, cores.bit_length()) if 2 ** i <= cores), cores})
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default=",".join(map(str, default_levels)), help="comma-separated worker counts")
+    parser.add_argument("--chunks", type=int, default=4000)
+    parser.add_argument("--batch-size", type=int, default=32, help="texts per forward pass")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="torch threads per worker (0 = cores / workers)")
+    parser.add_argument("--model", choices=["standin", "huggingface"], default="standin")
+    parser.add_argument("--token-us", type=float, default=2.0, help="stand-in cost per padded token, microseconds")
+    args = parser.parse_args()
+
+    if args.model == "huggingface":
+        from config import EMBEDDING_MODEL
+        from parallel_embeddings import huggingface_embeddings
+
+        factory = functools.partial(huggingface_embeddings, EMBEDDING_MODEL)
+    else:
+        factory = functools.partial(standin_model, per_token=args.token_us / 1e6)
+
+    texts = make_chunks(args.chunks)
+    levels = [int(level) for level in args.workers.split(",")]
+    print(f"{len(texts)} chunks ({sum(map(len, texts)) / len(texts):.0f} chars on average), {cores} cores, "
+          f"model {args.model}, batch size {args.batch_size}\n")
+    print(f"{'workers':>8}{'threads':>9}{'start s':>9}{'chunks/s':>10}{'speedup':>9}{'efficiency':>12}")
+
+    baseline = reference = None
+    for workers in levels:
+        engine, startup, elapsed, vectors = run(factory, texts, workers, args)
+        rate = len(texts) / elapsed
+        baseline = baseline or rate
+        if reference is None:
+            reference = vectors
+        elif not np.allclose(vectors, reference, atol=1e-5):
+            print(f"!! vectors from {workers} workers differ from the first run")
+        speedup = rate / baseline
+        print(f"{workers:>8}{engine.threads_per_worker:>9}{startup:>9.2f}{rate:>10.1f}{speedup:>8.2f}x"
+              f"{speedup / workers * levels[0]:>11.0%}")
+
+    _, _, elapsed, _ = run(factory, texts, levels[-1], args, sort_by_length=False)
+    print(f"\nwithout length sorting at {levels[-1]} workers: {len(texts) / elapsed:.1f} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
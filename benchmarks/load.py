@@ -0,0 +1,114 @@
+"""Load-test the HTTP service (server.py) at increasing concurrency, fully offline.
+
+    python -m benchmarks.load [--levels 1,2,4,8,16,32] [--requests 4] [--endpoint ask]
+
+Starts the service in-process against the local stand-ins (fake chat
+server, hash embeddings, in-memory Qdrant, fixture site) and, for each
+concurrency level, keeps that many clients sending requests until each
+has made --requests of them. Reports throughput, latency percentiles,
+errors and how many query embeddings the micro-batcher merged per call.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import aiohttp
+import numpy as np
+
+from benchmarks.run import QUERIES, configure_environment
+
+
+async def client(session, url, endpoint, requests, offset, latencies, errors):
+    for i in range(requests):
+        # Unique text per request so neither the response cache nor the
+        # query LRU can answer it; only in-flight requests get merged
+        text = f"{QUERIES[(offset + i) % len(QUERIES)]} (request {offset}-{i})"
+        payload = {"question": text} if endpoint == "ask" else {"text": text}
+        start = time.perf_counter()
+        try:
+            async with session.post(f"{url}/{endpoint}", json=payload) as response:
+                await response.read()
+                if response.status != 200:
+                    errors.append(response.status)
+                    continue
+        except aiohttp.ClientError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_level(url, endpoint, concurrency, requests):
+    latencies, errors = [], []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client(session, url, endpoint, requests, worker * requests, latencies, errors)
+            for worker in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=4, help="requests per client at each level")
+    parser.add_argument("--endpoint", choices=["ask", "emotion"], default="ask")
+    parser.add_argument("--pages", type=int, default=30, help="fixture pages ingested before the test")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=2)
+    parser.add_argument("--backend", choices=["qdrant", "local"], default="qdrant")
+    args = parser.parse_args()
+
+    from benchmarks.standins import BackgroundServer, FakeChatServer, FixtureSite, HashEmbeddings, OpenAICompatibleChat
+
+    chat = FakeChatServer(first_token_latency=args.first_token_ms / 1000, token_latency=args.token_ms / 1000).start()
+    site = FixtureSite().start()
+    args.llm_base_url = chat.base_url
+    configure_environment(args, tempfile.mkdtemp(prefix="bench_load_"))
+
+    from config import CACHE_DIR
+    from embeddings import CachedEmbeddings, EmbeddingCache, set_embeddings
+    from server import RagService, create_app
+
+    set_embeddings(CachedEmbeddings(
+        HashEmbeddings(), "hash-384", EmbeddingCache(os.path.join(CACHE_DIR, "embeddings.sqlite"))
+    ))
+    service = RagService(
+        llm=OpenAICompatibleChat(base_url=chat.base_url),
+        seed_urls=site.page_urls(args.pages),
+        use_response_cache=False,
+        llm_concurrency=args.llm_concurrency,
+    )
+    server = BackgroundServer(create_app(service)).start()
+
+    print(f"endpoint /{args.endpoint}, {args.requests} requests per client, "
+          f"LLM concurrency {args.llm_concurrency}, first token {args.first_token_ms:.0f} ms\n")
+    print(f"{'clients':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'embeds/call':>13}")
+    try:
+        for concurrency in (int(level) for level in args.levels.split(",")):
+            requests_before, batches_before = service.embeddings.requests, service.embeddings.batches
+            latencies, errors, elapsed = asyncio.run(
+                run_level(server.url, args.endpoint, concurrency, args.requests)
+            )
+            batches = service.embeddings.batches - batches_before
+            merged = (service.embeddings.requests - requests_before) / batches if batches else 0.0
+            if latencies:
+                p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+            else:
+                p50 = p95 = p99 = float("nan")
+            print(f"{concurrency:>8}{len(latencies) / elapsed:>9.1f}{p50:>9.0f}{p95:>9.0f}{p99:>9.0f}"
+                  f"{len(errors):>8}{merged:>13.1f}")
+    finally:
+        server.stop()
+        chat.stop()
+        site.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Compare single-query, sequential multi-query and batched multi-query retrieval.
+
+    python -m benchmarks.multi_query [--qdrant-url http://localhost:6333] [--docs 5000] [--generator-ms 800]
+
+Without --qdrant-url an in-memory Qdrant is used, which has no network hop;
+point it at a real server to see the round trips that batching saves.
+
+The retrievers are built the way the app builds them (default fetch_k).
+The expanded runs include the question generator, which stands in for
+the generate_questions LLM call by sleeping --generator-ms; that round
+trip, not the search, dominates the cost of expansion.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from langchain_qdrant import QdrantVectorStore
+
+from benchmarks import WORDS
+from benchmarks.standins import HashEmbeddings
+from retrieval import MultiQueryRetriever, reciprocal_rank_fusion
+
+
+QUERY = "how do I manage stress at work"
+EXPANSIONS = [
+    "what are quick breathing exercises for anxiety",
+    "how does poor sleep affect stress levels",
+    "when should I talk to a professional about burnout",
+]
+
+def build_store(embeddings, docs, qdrant_url):
+    client_options = {"url": qdrant_url} if qdrant_url else {"location": ":memory:"}
+    store = QdrantVectorStore.construct_instance(
+        embedding=embeddings,
+        client_options=client_options,
+        collection_name="bench_multi_query",
+        force_recreate=True,
+    )
+    rng = random.Random(0)
+    texts = [" ".join(rng.choices(WORDS, k=60)) for _ in range(docs)]
+    store.add_texts(texts, batch_size=256)
+    return store
+
+
+def percentile(samples, q):
+    return statistics.quantiles(samples, n=100)[q - 1] * 1000
+
+
+def measure(name, fn, repeats):
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    print(f"{name:<32} p50 {percentile(samples, 50):7.1f} ms   p95 {percentile(samples, 95):7.1f} ms")
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--qdrant-url", default=None)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--generator-ms", type=float, default=800, help="stand-in generate_questions latency")
+    args = parser.parse_args()
+
+    embeddings = HashEmbeddings()
+    store = build_store(embeddings, args.docs, args.qdrant_url)
+    queries = [QUERY] + EXPANSIONS
+
+    def generate(_):
+        time.sleep(args.generator_ms / 1000)
+        return EXPANSIONS
+
+    def single():
+        store.similarity_search_by_vector(embeddings.embed_query(QUERY), k=args.k)
+
+    def sequential():
+        results = []
+        generate(QUERY)
+        for query in queries:
+            docs = store.similarity_search_by_vector(embeddings.embed_query(query), k=args.k)
+            results.append([(doc.metadata["_id"], 0.0, doc) for doc in docs])
+        reciprocal_rank_fusion(results)
+
+    plain = MultiQueryRetriever(vector_store=store, k=args.k)
+    expanded = MultiQueryRetriever(vector_store=store, k=args.k, question_generator=generate)
+    search_only = MultiQueryRetriever(vector_store=store, k=args.k, question_generator=lambda _: EXPANSIONS)
+
+    print(f"{args.docs} docs, {len(queries)} queries, k={args.k}, generator {args.generator_ms:.0f} ms, "
+          f"backend={'qdrant server' if args.qdrant_url else 'in-memory qdrant'}\n")
+    one = measure("1 query", single, args.repeats)
+    default = measure("1 query, retriever (default)", lambda: plain.invoke(QUERY), args.repeats)
+    measure(f"{len(queries)} queries, sequential", sequential, args.repeats)
+    batched = measure(f"{len(queries)} queries, batched + RRF", lambda: expanded.invoke(QUERY), args.repeats)
+    searched = measure(f"{len(queries)} queries, search only", lambda: search_only.invoke(QUERY), args.repeats)
+    print(f"\nthe default retriever costs {default / one:.2f}x a single query")
+    print(f"batched {len(queries)}-query search costs {searched / one:.2f}x a single query, "
+          f"{batched / one:.2f}x with question generation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""End-to-end benchmark of the RAG and emotion-detection paths, fully offline.
+
+    python -m benchmarks.run [--pages 40] [--pdfs 10] [--queries 20] [--backend qdrant]
+
+Runs inject_documents, add_new_url, generate_response and emotion_detection
+against local stand-ins (see benchmarks.standins): a fake OpenAI-compatible
+chat server, deterministic hash embeddings, an in-memory Qdrant (or the
+embedded local index) and a fixture site serving HTML and PDF pages.
+
+Reports ingest chunks/sec, per-stage latency percentiles and peak RSS,
+saves them to benchmarks/results/<timestamp>.json and compares them with
+the previous run there, flagging anything that got worse by more than
+--threshold.
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import peak_rss_mb
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+QUERIES = [
+    "How do I manage stress at work?",
+    "I can't sleep because I keep worrying, what can I do?",
+    "What are some breathing exercises for anxiety?",
+    "How can I build a healthier daily routine?",
+    "When should I talk to a professional about my mood?",
+    "How does exercise help with mental health?",
+    "I feel isolated from my friends and family lately",
+    "What is mindfulness and how do I start?",
+]
+
+# Options that do not change what is measured
+RUN_OPTIONS = {"results_dir", "llm_base_url", "threshold", "no_save", "fail_on_regression"}
+
+# Metrics where a larger value is an improvement; everything else is a cost
+HIGHER_IS_BETTER = {"ingest_chunks_per_s"}
+
+
+def percentiles(samples):
+    values = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def timed(function, *args, **kwargs):
+    """Call function with its console output suppressed; return (result, seconds)"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def configure_environment(args, workdir):
+    """Point the repo's settings at the stand-ins; must run before importing it"""
+    os.environ.update({
+        "RAG_CACHE_DIR": os.path.join(workdir, "cache"),
+        "LOCAL_INDEX_DIR": os.path.join(workdir, "local_index"),
+        "QDRANT_URL": ":memory:",
+        "VECTOR_BACKEND": args.backend,
+        "LLM_BASE_URL": args.llm_base_url,
+        "API_KEY": "offline-benchmark",
+    })
+
+
+def run(args, chat, site, workdir):
+    configure_environment(args, workdir)
+
+    from langchain_core.prompts import ChatPromptTemplate
+
+    from benchmarks.standins import HashEmbeddings, OpenAICompatibleChat
+    from config import CACHE_DIR, COLLECTION_NAME
+    from embeddings import CachedEmbeddings, EmbeddingCache, set_embeddings
+    import assistant
+    import rag_with_gemini as rag
+    from semantic_cache import SemanticCache
+
+    model = HashEmbeddings(call_overhead=args.embed_call_ms / 1000, per_text=args.embed_text_ms / 1000)
+    embeddings = CachedEmbeddings(model, "hash-384", EmbeddingCache(os.path.join(CACHE_DIR, "embeddings.sqlite")))
+    set_embeddings(embeddings)
+
+    stages = {}
+    metrics = {}
+    urls = site.page_urls(args.pages) + site.pdf_urls(args.pdfs)
+
+    # Ingestion: a cold run embeds everything, a warm run should embed nothing
+    _, elapsed = timed(rag.inject_documents, urls)
+    metrics["ingest_chunks"] = embeddings.misses
+    metrics["ingest_chunks_per_s"] = embeddings.misses / elapsed
+    metrics["ingest_cold_s"] = elapsed
+    _, metrics["ingest_warm_s"] = timed(rag.inject_documents, urls)
+
+    vector_store = rag.open_vector_store(COLLECTION_NAME, embeddings)
+    stages["add_url_new"] = []
+    stages["add_url_unchanged"] = []
+    for url in site.page_urls(args.add_urls, start=args.pages):
+        stages["add_url_new"].append(timed(rag.add_new_url, url, vector_store)[1])
+        stages["add_url_unchanged"].append(timed(rag.add_new_url, url, vector_store)[1])
+
+    # Query path, first without the response cache, then repeated questions through it
+    llm = OpenAICompatibleChat(base_url=chat.base_url)
+    retriever = rag.build_retriever(vector_store, llm)
+    prompt = ChatPromptTemplate.from_template(rag.ANSWER_TEMPLATE)
+    rag_chain = rag.build_rag_chain(retriever, prompt, llm)
+    queries = [QUERIES[i % len(QUERIES)] for i in range(args.queries)]
+
+    for query in queries:
+        _, _, timings = timed(rag.generate_response, query, rag_chain)[0]
+        for stage, seconds in timings.items():
+            stages.setdefault(f"query_{stage}", []).append(seconds)
+
+    response_cache = SemanticCache(embeddings, namespace=COLLECTION_NAME)
+    for query in dict.fromkeys(queries):
+        timed(rag.generate_response, query, rag_chain, response_cache)
+    stages["query_cached"] = [
+        timed(rag.generate_response, query, rag_chain, response_cache)[1] for query in queries
+    ]
+
+    stages["emotion_detection"] = [timed(assistant.emotion_detection, query)[1] for query in queries]
+
+    for stage, samples in stages.items():
+        for name, value in percentiles(samples).items():
+            metrics[f"{stage}_{name}"] = value
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    return metrics
+
+
+def load_previous(results_dir):
+    runs = sorted(glob.glob(os.path.join(results_dir, "*.json")))
+    if not runs:
+        return None, None
+    with open(runs[-1], encoding="utf-8") as f:
+        return runs[-1], json.load(f)
+
+
+def save(results_dir, result):
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def compare(metrics, previous, threshold):
+    """Print metrics next to the previous run; return the names that regressed"""
+    regressions = []
+    print(f"{'metric':<36}{'value':>12}{'previous':>12}{'change':>9}")
+    for name, value in metrics.items():
+        old = previous.get(name) if previous else None
+        if not old:
+            print(f"{name:<36}{value:>12.2f}")
+            continue
+
+        change = (value - old) / old
+        worse = -change if name in HIGHER_IS_BETTER else change
+        flag = ""
+        if worse > threshold and name != "ingest_chunks":
+            regressions.append(name)
+            flag = "  ⚠️ regression"
+        print(f"{name:<36}{value:>12.2f}{old:>12.2f}{change:>+9.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=40, help="HTML pages to ingest")
+    parser.add_argument("--pdfs", type=int, default=10, help="PDF documents to ingest")
+    parser.add_argument("--add-urls", type=int, default=5, help="URLs added one by one with add_new_url")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--backend", choices=["qdrant", "local"], default="qdrant")
+    parser.add_argument("--first-token-ms", type=float, default=300, help="fake LLM time to first token")
+    parser.add_argument("--token-ms", type=float, default=10, help="fake LLM time per streamed token")
+    parser.add_argument("--embed-call-ms", type=float, default=20, help="stand-in embedding cost per call")
+    parser.add_argument("--embed-text-ms", type=float, default=2, help="stand-in embedding cost per text")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--no-save", action="store_true", help="compare without recording this run")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on regressions")
+    args = parser.parse_args()
+
+    from benchmarks.standins import FakeChatServer, FixtureSite
+
+    chat = FakeChatServer(first_token_latency=args.first_token_ms / 1000, token_latency=args.token_ms / 1000).start()
+    site = FixtureSite().start()
+    args.llm_base_url = chat.base_url
+    workdir = tempfile.mkdtemp(prefix="bench_run_")
+    try:
+        metrics = run(args, chat, site, workdir)
+    finally:
+        chat.stop()
+        site.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    previous_path, previous = load_previous(args.results_dir)
+    config = {key: value for key, value in vars(args).items() if key not in RUN_OPTIONS}
+    if previous and previous.get("config") != config:
+        print(f"Note: {previous_path} was run with different settings\n")
+
+    regressions = compare(metrics, previous and previous["metrics"], args.threshold)
+    if not args.no_save:
+        print(f"\nSaved to {save(args.results_dir, {'config': config, 'metrics': metrics})}")
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
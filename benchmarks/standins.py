@@ -0,0 +1,365 @@
+"""Local stand-ins for the services the RAG scripts normally talk to.
+
+- HashEmbeddings:       deterministic embeddings with a simulated model cost
+- FakeChatServer:       OpenAI-compatible /v1/chat/completions with configurable latency
+- OpenAICompatibleChat: LangChain chat model that talks to such a server
+- FixtureSite:          HTTP server with generated HTML articles and PDF pages
+
+An in-memory Qdrant needs no stand-in: set QDRANT_URL=":memory:".
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Iterator
+
+import numpy as np
+from aiohttp import web
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from openai import OpenAI
+
+from benchmarks import WORDS
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic feature-hashing embeddings with a simulated model cost.
+
+    Every call pays `call_overhead` seconds plus `per_text` seconds per
+    text, roughly how a small transformer behaves on CPU: batching many
+    texts into one call is much cheaper than one call per text. With
+    `per_token`, texts are also run in forward passes of `batch_size`,
+    each costing `per_token` per word of the longest text times the batch
+    size, as padding does. `busy` spends the cost on the CPU instead of
+    sleeping, for benchmarks where cores are the bottleneck.
+    """
+
+    def __init__(self, dim=384, call_overhead=0.02, per_text=0.002, per_token=0.0, batch_size=32, busy=False):
+        self.dim = dim
+        self.call_overhead = call_overhead
+        self.per_text = per_text
+        self.per_token = per_token
+        self.batch_size = batch_size
+        self.busy = busy
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _cost(self, texts):
+        cost = self.call_overhead + self.per_text * len(texts)
+        if self.per_token:
+            for start in range(0, len(texts), self.batch_size):
+                batch = texts[start:start + self.batch_size]
+                cost += self.per_token * len(batch) * max(len(text.split()) for text in batch)
+        return cost
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        cost = self._cost(texts)
+        if self.busy:
+            deadline = time.perf_counter() + cost
+            while time.perf_counter() < deadline:
+                pass
+        else:
+            time.sleep(cost)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class BackgroundServer:
+    """Run an aiohttp application on its own event loop thread"""
+
+    def __init__(self, app, host="127.0.0.1", port=0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        runner = web.AppRunner(self.app, access_log=None)
+        self._loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{self.host}:{self.port}"
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(runner.cleanup())
+
+
+EMOTION_RESPONSE = {
+    "primary_emotion": "stress",
+    "secondary_emotions": ["anxiety", "worry"],
+    "intensity": "moderate",
+    "risk_factors": ["sleep disturbance"],
+    "confidence": 0.85,
+}
+
+
+def _agent_step(messages):
+    """Next step of a model following the system prompt one tool at a time"""
+    observations = []
+    for message in reversed(messages):
+        if message["role"] == "user":
+            try:
+                content = json.loads(message["content"])
+            except (json.JSONDecodeError, TypeError):
+                break
+            if not isinstance(content, dict) or content.get("step") != "observe":
+                break
+            observations.insert(0, content["output"])
+
+    plan = [
+        ("emotion_detection", "emotion_detect", {}),
+        ("query_processing", "generate_questions", {}),
+        ("knowledge_retrieval", "vector_search", None),
+        ("safety_check", "safety_protocol", {}),
+        ("response_generation", "combine_knowledge", {}),
+    ]
+    if len(observations) >= len(plan):
+        return {"step": "output", "content": str(observations[-1])}
+
+    step, function, arguments = plan[len(observations)]
+    if arguments is None:
+        questions = observations[1] if isinstance(observations[1], list) else []
+        arguments = {"questions": questions}
+    return {"step": step, "content": f"Calling {function}", "function": function, "input": arguments}
+
+
+class FakeChatServer(BackgroundServer):
+    """OpenAI-compatible chat completions endpoint with canned answers.
+
+    Non-streaming responses take `first_token_latency + tokens * token_latency`;
+    streaming responses send the first token after `first_token_latency` and
+    then one token every `token_latency` seconds. Requests asking for JSON
+    get an emotion analysis (or, with the agent system prompt, the next
+    agent step), question-expansion prompts get three questions.
+    A fraction `error_rate` of requests fails with 429 or 503, as a
+    rate-limited or overloaded provider would.
+    """
+
+    def __init__(self, first_token_latency=0.3, token_latency=0.01, answer_tokens=120, error_rate=0.0, **kwargs):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._completions)
+        super().__init__(app, **kwargs)
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def base_url(self):
+        return f"{self.url}/v1"
+
+    def _answer(self, body):
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            messages = body.get("messages", [])
+            if messages and "Available Tools" in str(messages[0].get("content", "")):
+                return json.dumps(_agent_step(messages))
+            return json.dumps(EMOTION_RESPONSE)
+        prompt = " ".join(str(message.get("content", "")) for message in body.get("messages", []))
+        if "related questions" in prompt:
+            return "\n".join([
+                "What are quick ways to calm down when stressed?",
+                "How does sleep affect stress and mood?",
+                "When should someone seek professional help for stress?",
+            ])
+        rng = random.Random(len(prompt))
+        return " ".join(rng.choice(WORDS) for _ in range(self.answer_tokens))
+
+    async def _completions(self, request):
+        self.requests += 1
+        if random.random() < self.error_rate:
+            self.errors += 1
+            status = random.choice([429, 503])
+            return web.json_response({"error": {"message": "try again later", "code": status}}, status=status)
+
+        body = await request.json()
+        answer = self._answer(body)
+        tokens = re.findall(r"\S+\s*", answer)
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(self.first_token_latency + self.token_latency * len(tokens))
+            return web.json_response({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": len(json.dumps(body)) // 4, "completion_tokens": len(tokens),
+                          "total_tokens": len(json.dumps(body)) // 4 + len(tokens)},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(self.first_token_latency)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+class OpenAICompatibleChat(BaseChatModel):
+    """Minimal LangChain chat model for an OpenAI-compatible endpoint"""
+
+    base_url: str
+    model: str = "fake"
+    api_key: str = "not-needed"
+
+    @property
+    def _llm_type(self) -> str:
+        return "openai-compatible"
+
+    def _client(self):
+        return OpenAI(base_url=self.base_url, api_key=self.api_key)
+
+    @staticmethod
+    def _messages(messages):
+        roles = {"human": "user", "ai": "assistant", "system": "system"}
+        return [{"role": roles.get(m.type, "user"), "content": m.content} for m in messages]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        response = self._client().chat.completions.create(
+            model=self.model, messages=self._messages(messages)
+        )
+        message = AIMessage(content=response.choices[0].message.content)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        stream = self._client().chat.completions.create(
+            model=self.model, messages=self._messages(messages), stream=True
+        )
+        for chunk in stream:
+            token = chunk.choices[0].delta.content or ""
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def make_pdf(lines):
+    """Build a one-page PDF showing `lines` of text in Helvetica"""
+    def escape(text):
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    content = "BT /F1 11 Tf 50 780 Td 14 TL " + " ".join(f"({escape(line)}) '" for line in lines) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    pdf += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return pdf
+
+
+class FixtureSite(BackgroundServer):
+    """Serves /page/<n>.html articles and /doc/<n>.pdf documents.
+
+    Pages are generated deterministically from their number and carry an
+    ETag, so a second crawl is answered with 304 Not Modified. Bump
+    `version` to make every page change.
+    """
+
+    def __init__(self, paragraphs=12, words_per_paragraph=80, **kwargs):
+        app = web.Application()
+        app.router.add_get("/page/{n}.html", self._page)
+        app.router.add_get("/doc/{n}.pdf", self._pdf)
+        super().__init__(app, **kwargs)
+        self.paragraphs = paragraphs
+        self.words_per_paragraph = words_per_paragraph
+        self.version = 1
+
+    def page_urls(self, count, start=0):
+        return [f"{self.url}/page/{n}.html" for n in range(start, start + count)]
+
+    def pdf_urls(self, count, start=0):
+        return [f"{self.url}/doc/{n}.pdf" for n in range(start, start + count)]
+
+    def _paragraphs(self, n):
+        rng = random.Random(f"{n}:{self.version}")
+        return [
+            " ".join(rng.choice(WORDS) for _ in range(self.words_per_paragraph)).capitalize() + "."
+            for _ in range(self.paragraphs)
+        ]
+
+    def _etag(self, n):
+        return f'"{n}-{self.version}"'
+
+    async def _page(self, request):
+        n = int(request.match_info["n"])
+        if request.headers.get("If-None-Match") == self._etag(n):
+            return web.Response(status=304)
+        body = "".join(f"<p>{paragraph}</p>" for paragraph in self._paragraphs(n))
+        html = (
+            f"<html><head><title>Article {n}</title><style>p {{}}</style></head><body>"
+            f"<nav>Home | About | Contact</nav><article><h1>Article {n}</h1>{body}</article>"
+            f"<footer>Copyright fixture site</footer><script>var x = 1;</script></body></html>"
+        )
+        return web.Response(text=html, content_type="text/html", headers={"ETag": self._etag(n)})
+
+    async def _pdf(self, request):
+        n = int(request.match_info["n"])
+        if request.headers.get("If-None-Match") == self._etag(n):
+            return web.Response(status=304)
+        lines = [line for paragraph in self._paragraphs(n)[:4] for line in re.findall(r"(?:\S+ ?){1,12}", paragraph)]
+        return web.Response(
+            body=make_pdf(lines[:50]),
+            content_type="application/pdf",
+            headers={"ETag": self._etag(n)},
+        )
@@ -0,0 +1,94 @@
+"""Report CLI startup cost: module import times and time until the prompt appears.
+
+    python -m benchmarks.startup [--module rag_with_gemini] [--top 15] [--budget 1.5]
+
+Imports the module in a fresh interpreter with `-X importtime` and lists
+the slowest imports, then starts the CLI script and measures how long it
+takes for the "You:" prompt to appear. With --budget the exit status is 1
+when time-to-prompt exceeds that many seconds, so this can guard CI.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies that should only load on first use, never at startup
+HEAVY_MODULES = ["torch", "transformers", "langchain_huggingface", "langchain_google_genai",
+                 "langchain_community", "qdrant_client"]
+
+
+def import_times(module):
+    """Return ({module: (self_us, cumulative_us)}, top-level module order)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def time_to_prompt(script, timeout=60):
+    """Seconds from process start until the script prints its input prompt"""
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, script], cwd=ROOT, env=env,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    output = b""
+    try:
+        while b"You:" not in output:
+            byte = process.stdout.read(1)
+            if not byte:
+                raise RuntimeError(f"{script} exited before showing a prompt:\n{output.decode(errors='replace')}")
+            output += byte
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"no prompt after {timeout}s")
+        elapsed = time.perf_counter() - start
+        process.communicate(b"exit\n", timeout=timeout)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="rag_with_gemini")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--budget", type=float, default=None, help="max seconds to the prompt")
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    total_us = times[args.module][1]
+    print(f"import {args.module}: {total_us / 1e6:.2f}s cumulative, {len(times)} modules\n")
+    print(f"{'module':<50}{'self ms':>10}{'cumul ms':>10}")
+    slowest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in slowest[:args.top]:
+        print(f"{name:<50}{self_us / 1000:>10.1f}{cumulative_us / 1000:>10.1f}")
+
+    eager = [name for name in HEAVY_MODULES if name in times]
+    if eager:
+        print(f"\n⚠️ Imported at startup, should be lazy: {', '.join(eager)}")
+
+    elapsed = time_to_prompt(f"{args.module}.py")
+    print(f"\nTime to prompt ({args.module}.py): {elapsed:.2f}s")
+    if args.budget is not None and elapsed > args.budget:
+        print(f"Over the {args.budget:.2f}s budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
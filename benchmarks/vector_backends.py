@@ -0,0 +1,139 @@
+"""Compare query latency, recall and memory of the vector store backends.
+
+    python -m benchmarks.vector_backends [--rows 50000] [--qdrant-url http://localhost:6333]
+
+Backends: the embedded LocalVectorStore (exact float32 scan, int8 scan with
+float32 re-ranking, IVF approximate index) and Qdrant (the server at
+--qdrant-url, or in-process `:memory:` mode when no URL is given).
+Each backend runs in its own process so peak RSS is measured in isolation.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from benchmarks import peak_rss_mb
+from benchmarks.standins import HashEmbeddings
+from retrieval import search_batch
+
+
+def make_data(rows, dim, queries, batch_size=1000, seed=0):
+    """Clustered unit vectors, closer to real sentence embeddings than pure noise.
+
+    Returns the query vectors and a generator of row batches, so the corpus
+    itself never has to sit in memory next to the index being measured.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(rows // 250, 1), dim))
+
+    def sample(count, rng):
+        vectors = centers[rng.integers(len(centers), size=count)] + 0.6 * rng.normal(size=(count, dim))
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+    def batches():
+        for begin in range(0, rows, batch_size):
+            count = min(batch_size, rows - begin)
+            yield begin, sample(count, np.random.default_rng((seed, begin)))
+
+    return sample(queries, rng), batches()
+
+
+def open_store(backend, args, workdir):
+    embeddings = HashEmbeddings(dim=args.dim, call_overhead=0, per_text=0)
+    if backend.startswith("local"):
+        from local_store import LocalVectorStore
+
+        return LocalVectorStore(
+            "bench",
+            embeddings,
+            path=os.path.join(workdir, backend),
+            quantize=backend == "local-int8",
+            ann_min_rows=1 if backend == "local-ivf" else 0,
+        )
+
+    from langchain_qdrant import QdrantVectorStore
+
+    client_options = {"url": args.qdrant_url} if args.qdrant_url else {"location": ":memory:"}
+    return QdrantVectorStore.construct_instance(
+        embedding=embeddings,
+        client_options=client_options,
+        collection_name="bench_backends",
+        force_recreate=True,
+    )
+
+
+def run_backend(backend, args, workdir, results):
+    from ingest import upsert_vectors
+
+    probes, batches = make_data(args.rows, args.dim, args.queries)
+    baseline = peak_rss_mb()
+    store = open_store(backend, args, workdir)
+
+    start = time.perf_counter()
+    for begin, batch in batches:
+        ids = [f"00000000-0000-0000-0000-{i:012d}" for i in range(begin, begin + len(batch))]
+        docs = [Document(page_content=f"chunk {i}") for i in range(begin, begin + len(batch))]
+        upsert_vectors(store, ids, docs, batch.tolist())
+    build = time.perf_counter() - start
+
+    search_batch(store, [probes[0].tolist()], args.k)  # warm-up (builds the IVF index)
+    latencies, found = [], []
+    for probe in probes:
+        start = time.perf_counter()
+        hits = search_batch(store, [probe.tolist()], args.k)[0]
+        latencies.append(time.perf_counter() - start)
+        found.append([str(point_id) for point_id, _, _ in hits])
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    results[backend] = {
+        "build_s": build,
+        "p50_ms": quantiles[49] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "rss_mb": peak_rss_mb() - baseline,
+        "found": found,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--qdrant-url", default=None)
+    args = parser.parse_args()
+
+    backends = ["local-f32", "local-int8", "local-ivf", "qdrant"]
+    workdir = tempfile.mkdtemp(prefix="bench_backends_")
+    context = multiprocessing.get_context("spawn")
+    results = context.Manager().dict()
+    try:
+        for backend in backends:
+            process = context.Process(target=run_backend, args=(backend, args, workdir, results))
+            process.start()
+            process.join()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    qdrant = f"qdrant ({'server' if args.qdrant_url else 'in-memory'})"
+    print(f"{args.rows} vectors x {args.dim} dims, {args.queries} queries, k={args.k}\n")
+    print(f"{'backend':<22}{'build s':>9}{'p50 ms':>9}{'p99 ms':>9}{'recall':>8}{'peak RSS MB':>13}")
+    exact = results["local-f32"]["found"]
+    for backend in backends:
+        if backend not in results:
+            print(f"{backend:<22} failed")
+            continue
+        r = results[backend]
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(exact, r["found"])])
+        name = qdrant if backend == "qdrant" else backend
+        print(f"{name:<22}{r['build_s']:>9.2f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}{recall:>8.2f}{r['rss_mb']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
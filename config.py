@@ -0,0 +1,118 @@
+"""Runtime settings for the RAG scripts, read from the environment (and .env)"""
+import os
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+
+# Embeddings
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# Local on-disk caches (embeddings, HTTP validators, manifests, ...)
+CACHE_DIR = os.getenv("RAG_CACHE_DIR", ".cache")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# URL ingestion
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "16"))
+FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", "4"))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "30"))
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "3"))
+
+# Vector store (QDRANT_URL=":memory:" runs Qdrant in-process, e.g. for benchmarks)
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "mental_health_articles")
+
+# Ingestion pipeline
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
+# Max items waiting between two pipeline stages before the producer blocks
+PIPELINE_QUEUE_DEPTH = int(os.getenv("PIPELINE_QUEUE_DEPTH", "4"))
+
+# Ingest-side embedding (parallel_embeddings.py): worker processes, each with its
+# own model copy (1 = in-process only; capped at the core count), torch threads
+# per worker (0 = cores / workers), texts per model forward pass, and the
+# smallest call worth the process pool
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "2"))
+EMBED_THREADS_PER_WORKER = int(os.getenv("EMBED_THREADS_PER_WORKER", "0"))
+EMBED_MODEL_BATCH_SIZE = int(os.getenv("EMBED_MODEL_BATCH_SIZE", "32"))
+EMBED_MIN_PARALLEL = int(os.getenv("EMBED_MIN_PARALLEL", "256"))
+
+# Retrieval
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "3"))
+# Extra LLM-generated questions searched alongside the user's query (0 = off).
+# Off by default: generating them is a blocking LLM call before the first answer token
+MULTI_QUERY_EXPANSIONS = int(os.getenv("MULTI_QUERY_EXPANSIONS", "0"))
+
+# Semantic response cache
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Vector store backend: "qdrant" (remote server) or "local" (embedded index)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+# Keep an int8 copy of the vectors and scan that instead of the float32 matrix
+LOCAL_INDEX_QUANTIZE = os.getenv("LOCAL_INDEX_QUANTIZE", "0") == "1"
+# Switch to the approximate (IVF) index once the collection has this many rows (0 = never)
+LOCAL_INDEX_ANN_MIN_ROWS = int(os.getenv("LOCAL_INDEX_ANN_MIN_ROWS", "100000"))
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "16"))
+# Rewrite the vectors and log once this fraction of the log is deleted or overwritten (0 = never)
+LOCAL_INDEX_COMPACT_FRACTION = float(os.getenv("LOCAL_INDEX_COMPACT_FRACTION", "0.3"))
+
+# Metrics and tracing: JSON log of every timed stage, Prometheus-style
+# endpoint and/or a file the same text is written to on exit (empty/0 = off)
+METRICS_LOG_FILE = os.getenv("METRICS_LOG_FILE", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_DUMP_FILE = os.getenv("METRICS_DUMP_FILE", "")
+
+# HTTP service mode (server.py)
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+# Threads running blocking work (chains, ingestion) for concurrent requests
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "64"))
+# Max LLM calls in flight at once, across all requests
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+# Query embeddings arriving within this window share one model call
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+
+# OpenAI-compatible endpoint used for emotion detection and the agent
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/openai/")
+
+# Agent executor (agent.py): planning model and max model round trips per user turn
+AGENT_MODEL = os.getenv("AGENT_MODEL", "gemini-2.0-flash")
+AGENT_MAX_STEPS = int(os.getenv("AGENT_MAX_STEPS", "8"))
+# Start emotion detection, question generation and search before the model asks
+# for them (paid calls that are wasted when it answers directly); off by default,
+# and skipped for messages shorter than AGENT_PREFETCH_MIN_WORDS (greetings, thanks)
+AGENT_PREFETCH = os.getenv("AGENT_PREFETCH", "0") == "1"
+AGENT_PREFETCH_MIN_WORDS = int(os.getenv("AGENT_PREFETCH_MIN_WORDS", "5"))
+
+# Max tokens of retrieved context sent to the LLM, after merging and
+# deduplicating chunks (context_packing.py)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Conversation memory (memory.py): token budget for the history (running summary
+# plus stored turns; the system prompt is on top), turns always kept verbatim and
+# the size of the summary older turns are folded into
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "2000"))
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "4"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+
+# Batch emotion scoring (batch_emotion.py)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+# Requests per second allowed by the upstream quota (token bucket refill rate)
+BATCH_RATE_LIMIT = float(os.getenv("BATCH_RATE_LIMIT", "10"))
+BATCH_RETRIES = int(os.getenv("BATCH_RETRIES", "5"))
+
+# Local emotion classifier (emotion_classifier.py): answers confident,
+# low-risk messages without an LLM call once a model has been trained
+EMOTION_CLASSIFIER_PATH = os.getenv("EMOTION_CLASSIFIER_PATH", os.path.join(CACHE_DIR, "emotion_classifier.joblib"))
+EMOTION_CLASSIFIER_ENABLED = os.getenv("EMOTION_CLASSIFIER_ENABLED", "1") == "1"
+# Calibrated probability both primary emotion and intensity must reach
+EMOTION_CLASSIFIER_THRESHOLD = float(os.getenv("EMOTION_CLASSIFIER_THRESHOLD", "0.85"))
+# Append every LLM emotion analysis here as training data (empty = off)
+EMOTION_LOG_FILE = os.getenv("EMOTION_LOG_FILE", "")
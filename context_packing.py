@@ -0,0 +1,209 @@
+"""Pack retrieved chunks into a compact prompt context before the LLM call.
+
+Chunks are split with CHUNK_OVERLAP characters of overlap, scraped pages
+carry navigation and footer boilerplate, and multi-query retrieval often
+returns neighbouring chunks of one page. Joined as they are, the prompt
+repeats the same text several times. The retrieved documents are instead:
+
+1. merged: chunks of one document (source and PDF page) that overlap or
+   touch become one passage. They are placed by `start_index` when both
+   chunks were split from the same version of the document (same
+   `content_version`); chunks kept from an earlier version, or stored
+   before offsets were recorded, are matched by text instead: the end of
+   one chunk against the start of another
+2. deduplicated: passages mostly covered by more relevant ones are
+   dropped, then lines already included once (boilerplate, overlaps
+   across sources)
+3. trimmed: passages are taken in relevance order until the token budget
+   is reached; the last one is cut at a sentence boundary
+
+Tokens before and after are recorded on the `context_pack` stage, so
+`tokens_saved_total` in the metrics counts what packing took off the prompts.
+"""
+import re
+from dataclasses import dataclass
+
+from config import CONTEXT_TOKEN_BUDGET
+from memory import count_tokens, cut_at_sentence
+from metrics import stage
+
+
+# Splitters drop the separator between chunks ("\n\n", "\n" or " "), so
+# chunks this close are neighbours
+MAX_GAP_CHARS = 2
+# Shortest end/start match treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 30
+# Share of a passage's word shingles already in the context that makes it a near-duplicate
+NEAR_DUPLICATE = 0.8
+SHINGLE_WORDS = 5
+# A cut-down last passage shorter than this is not worth including
+MIN_PASSAGE_TOKENS = 40
+
+
+@dataclass
+class Passage:
+    source: object
+    text: str
+    # Position of the most relevant chunk it contains (0 = best)
+    rank: int
+    start: int = None
+    # Text the start offset refers to (see ingest.content_version)
+    version: str = None
+
+
+@dataclass
+class PackedContext:
+    text: str
+    passages: int
+    tokens_in: int
+    tokens_out: int
+
+    @property
+    def tokens_saved(self):
+        return self.tokens_in - self.tokens_out
+
+
+def pack_context(docs, budget=CONTEXT_TOKEN_BUDGET):
+    """Merge, deduplicate and trim relevance-ordered documents into one context string"""
+    raw = "\n\n".join(doc.page_content for doc in docs)
+    with stage("context_pack") as fields:
+        # PDF pages share a source, and each page's offsets start at 0
+        by_document = {}
+        for rank, doc in enumerate(docs):
+            document = (doc.metadata.get("source"), doc.metadata.get("page"))
+            by_document.setdefault(document, []).append(Passage(
+                document, doc.page_content, rank, doc.metadata.get("start_index"), doc.metadata.get("content_version")
+            ))
+
+        passages = sorted(
+            (passage for chunks in by_document.values() for passage in merge_chunks(chunks)),
+            key=lambda passage: passage.rank,
+        )
+        texts = _trim(_deduplicate(passages), budget)
+
+        packed = PackedContext("\n\n".join(texts), len(texts), count_tokens(raw), 0)
+        packed.tokens_out = count_tokens(packed.text)
+        fields.update(
+            documents=len(docs),
+            passages=packed.passages,
+            tokens_in=packed.tokens_in,
+            tokens_out=packed.tokens_out,
+            tokens_saved=packed.tokens_saved,
+        )
+    return packed
+
+
+def merge_chunks(chunks):
+    """Merge chunks of one document that overlap or touch into passages"""
+    versions = {}
+    unplaced = []
+    for chunk in chunks:
+        if chunk.start is not None and chunk.version is not None:
+            versions.setdefault(chunk.version, []).append(chunk)
+        else:
+            unplaced.append(chunk)
+
+    passages = []
+    for positioned in versions.values():
+        passages.extend(_merge_by_offset(positioned))
+    # Offsets of other versions (or none at all): match text instead
+    passages.extend(Passage(c.source, c.text, c.rank) for c in unplaced)
+    while True:
+        pair = next(
+            ((a, b, n) for a in passages for b in passages if a is not b and (n := _overlap(a.text, b.text))),
+            None,
+        )
+        if pair is None:
+            return passages
+        a, b, n = pair
+        a.text += b.text[n:]
+        a.rank = min(a.rank, b.rank)
+        passages.remove(b)
+
+
+def _merge_by_offset(chunks):
+    """Merge chunks whose start offsets refer to the same text"""
+    merged = []
+    end = None
+    for chunk in sorted(chunks, key=lambda c: c.start):
+        if merged and chunk.start <= end + MAX_GAP_CHARS:
+            last = merged[-1]
+            last.text += "\n" + chunk.text if chunk.start > end else chunk.text[end - chunk.start:]
+            last.rank = min(last.rank, chunk.rank)
+        else:
+            merged.append(Passage(chunk.source, chunk.text, chunk.rank, chunk.start, chunk.version))
+        # End offset in the document text (the joined text may be shorter by a separator)
+        end = max(end or 0, chunk.start + len(chunk.text))
+    return merged
+
+
+def _overlap(a, b):
+    """Length of the longest end of `a` that `b` starts with (0 if under MIN_OVERLAP_CHARS)"""
+    if min(len(a), len(b)) < MIN_OVERLAP_CHARS:
+        return 0
+    if b in a:
+        return len(b)
+    head = b[:MIN_OVERLAP_CHARS]
+    position = a.find(head, max(0, len(a) - len(b)))
+    while position != -1:
+        if b.startswith(a[position:]):
+            return len(a) - position
+        position = a.find(head, position + 1)
+    return 0
+
+
+def _normalise(text):
+    return re.sub(r"\W+", " ", text).strip().lower()
+
+
+def _shingles(text):
+    words = _normalise(text).split()
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+
+
+def _deduplicate(passages):
+    """Drop near-duplicate passages, then lines already seen in a more relevant one"""
+    seen_shingles = set()
+    seen_lines = set()
+    kept = []
+    for passage in passages:
+        shingles = _shingles(passage.text)
+        if shingles and len(shingles & seen_shingles) >= NEAR_DUPLICATE * len(shingles):
+            continue
+        seen_shingles |= shingles
+
+        lines = []
+        for line in passage.text.splitlines():
+            key = _normalise(line)
+            if not key:
+                if lines and lines[-1]:
+                    lines.append("")
+                continue
+            if key in seen_lines:
+                continue
+            seen_lines.add(key)
+            lines.append(line.strip())
+        text = "\n".join(lines).strip()
+        if text:
+            kept.append(text)
+    return kept
+
+
+def _trim(texts, budget):
+    """Passages in order until `budget` tokens, cutting the last at a sentence end"""
+    packed = []
+    used = 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if used + tokens <= budget:
+            packed.append(text)
+            used += tokens
+            continue
+
+        remaining = budget - used
+        if remaining >= MIN_PASSAGE_TOKENS:
+            cut = cut_at_sentence(text, remaining)
+            if count_tokens(cut) >= MIN_PASSAGE_TOKENS:
+                packed.append(cut)
+        break
+    return packed
@@ -0,0 +1,267 @@
+"""Process-wide embedding model with a persistent, content-addressed vector cache"""
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import (
+    CACHE_DIR,
+    EMBED_BATCH_WAIT_MS,
+    EMBED_MAX_BATCH,
+    EMBED_MODEL_BATCH_SIZE,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_MODEL,
+)
+from metrics import stage
+
+
+# SQLite refuses statements with more than 999 bound parameters on older builds
+_LOOKUP_BATCH_SIZE = 500
+
+
+class EmbeddingCache:
+    """SQLite-backed store of embedding vectors keyed by model name + text hash.
+
+    Entries carry a last-used timestamp; once the table grows past
+    `max_entries` the least recently used rows are evicted.
+    """
+
+    def __init__(self, path, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name, text):
+        """Build the cache key for a text embedded with a given model"""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model_name}:{digest}"
+
+    def get_many(self, keys):
+        """Return a {key: vector} dict for every key present in the cache"""
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH_SIZE):
+                batch = keys[start:start + _LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs, evicting old entries if over capacity"""
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count <= self.max_entries:
+            return
+        # Trim to 90% so we don't pay for an eviction on every insert
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only runs the model for texts not already cached.
+
+    Documents go through the persistent cache; recent query vectors are
+    kept in a small in-memory LRU so the same question is embedded once
+    even when several components (response cache, retriever) need it.
+    """
+
+    def __init__(self, embeddings, model_name, cache, query_cache_size=256):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+        self.query_cache_size = query_cache_size
+        self.hits = 0
+        self.misses = 0
+        self._query_vectors = OrderedDict()
+        self._query_lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        keys = [self.cache.make_key(self.model_name, text) for text in texts]
+        vectors = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # Embed each missing text once, even if it appears several times
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            with stage("embed_documents", texts=len(missing)):
+                new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(zip(missing.keys(), new_vectors))
+            vectors.update(zip(missing.keys(), new_vectors))
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts):
+        """Embed several queries in one model call, bypassing the document cache"""
+        texts = list(texts)
+        with self._query_lock:
+            found = {text: self._query_vectors[text] for text in texts if text in self._query_vectors}
+
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        if missing:
+            with stage("embed_queries", texts=len(missing)):
+                found.update(zip(missing, self.embeddings.embed_documents(missing)))
+
+        with self._query_lock:
+            for text in dict.fromkeys(texts):
+                self._query_vectors[text] = found[text]
+                self._query_vectors.move_to_end(text)
+            while len(self._query_vectors) > self.query_cache_size:
+                self._query_vectors.popitem(last=False)
+        return [found[text] for text in texts]
+
+
+class MicroBatchingEmbeddings(Embeddings):
+    """Merge query embeddings requested concurrently into one model call.
+
+    Callers block until their vectors are ready. A background thread takes
+    the first waiting request, collects whatever else arrives within
+    `max_wait_ms` (up to `max_batch` texts) and embeds it all in a single
+    forward pass. Document embedding is passed straight through: ingestion
+    already sends full batches.
+    """
+
+    def __init__(self, embeddings, max_wait_ms=EMBED_BATCH_WAIT_MS, max_batch=EMBED_MAX_BATCH):
+        self.embeddings = embeddings
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        self.requests = 0
+        self.batches = 0
+        self._pending = queue.Queue()
+        threading.Thread(target=self._run, name="embed-batcher", daemon=True).start()
+
+    @property
+    def mean_batch_size(self):
+        return self.requests / self.batches if self.batches else 0.0
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts):
+        future = Future()
+        self._pending.put((list(texts), future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._pending.get()]
+            size = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._embed(batch)
+
+    def _embed(self, batch):
+        texts = [text for texts, _ in batch for text in texts]
+        try:
+            with stage("embed_query_batch", texts=len(texts), requests=len(batch)):
+                if hasattr(self.embeddings, "embed_queries"):
+                    vectors = self.embeddings.embed_queries(texts)
+                else:
+                    vectors = self.embeddings.embed_documents(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.requests += len(batch)
+        self.batches += 1
+        offset = 0
+        for texts, future in batch:
+            future.set_result(vectors[offset:offset + len(texts)])
+            offset += len(texts)
+
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings():
+    """Return the shared embedding provider, loading the model on first use"""
+    global _embeddings
+
+    with _embeddings_lock:
+        if _embeddings is None:
+            # Pulls in torch/transformers, so only imported once actually needed
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            model = HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL, encode_kwargs={"batch_size": EMBED_MODEL_BATCH_SIZE}
+            )
+            cache = EmbeddingCache(os.path.join(CACHE_DIR, "embeddings.sqlite"))
+            _embeddings = CachedEmbeddings(model, EMBEDDING_MODEL, cache)
+    return _embeddings
+
+
+def set_embeddings(embeddings):
+    """Replace the shared embedding provider (offline runs, benchmarks)"""
+    global _embeddings
+
+    with _embeddings_lock:
+        _embeddings = embeddings
@@ -0,0 +1,346 @@
+"""Local emotion classifier that answers confident, risk-free messages without an LLM call.
+
+    python emotion_classifier.py train    data.jsonl [--results results.jsonl]
+    python emotion_classifier.py evaluate data.jsonl [--results results.jsonl]
+
+It is trained on stored LLM analyses and works on the same MiniLM
+sentence embeddings as the RAG side. The training data is either a
+`{"text", "emotion"}` log written by emotion_detection (EMOTION_LOG_FILE),
+or batch_emotion.py results joined with their input file.
+
+Models:
+- primary_emotion and intensity: one calibrated logistic regression each
+- risk_factors: a one-vs-rest model
+- crisis risk: a separate head
+
+A message is answered locally only when both calibrated probabilities
+reach the threshold and no risk is predicted. Any of these sends it to
+the LLM:
+- crisis wording in the text
+- any predicted risk factor
+- a crisis-head probability above CRISIS_PROBABILITY
+- severe predicted intensity
+- a class too rare to learn
+Crisis checks are never skipped, whatever the threshold.
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from config import (
+    EMBEDDING_MODEL,
+    EMOTION_CLASSIFIER_ENABLED,
+    EMOTION_CLASSIFIER_PATH,
+    EMOTION_CLASSIFIER_THRESHOLD,
+    EMOTION_LOG_FILE,
+)
+from retrieval import embed_queries
+
+
+# Wording that always goes to the LLM (and its safety handling), never the fast path
+CRISIS_TEXT = re.compile(
+    r"suicid|kill(ing)? (myself|me)|end(ing)? (it all|my life)|self[- ]?harm|"
+    r"(hurt|cut|harm)(ing)? myself|overdose|want(ed)? to die|better off dead|"
+    r"no reason to live|(don'?t|do not) want to (live|be alive|be here|wake up)",
+    re.IGNORECASE,
+)
+# Risk factors in the LLM's analyses that mark a message as crisis risk
+CRISIS_LABEL = re.compile(r"suicid|self[- ]?harm|harm to (self|others)|crisis|kill|overdose|die|hopeless", re.IGNORECASE)
+# Crisis-head probability above which a message is treated as crisis risk
+CRISIS_PROBABILITY = 0.05
+# Probability above which a risk factor is reported
+RISK_FACTOR_PROBABILITY = 0.5
+# Classes with fewer training examples are pooled and never answered locally
+MIN_CLASS_EXAMPLES = 5
+RARE = "__rare__"
+
+_log_lock = threading.Lock()
+
+
+def is_crisis(emotion):
+    """Whether an LLM analysis flags crisis risk"""
+    return any(CRISIS_LABEL.search(str(factor)) for factor in emotion.get("risk_factors") or [])
+
+
+def record_llm_result(text, emotion, path=EMOTION_LOG_FILE):
+    """Append an LLM analysis to the training log, if one is configured"""
+    if not path:
+        return
+    with _log_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"text": text, "emotion": emotion}, ensure_ascii=False) + "\n")
+
+
+def load_examples(data_path, results_path=None, text_fields=("text",), id_field="id"):
+    """Return (texts, emotions) of usable LLM analyses.
+
+    Without `results_path`, every line of `data_path` holds "text" and
+    "emotion". With it, `data_path` is the batch_emotion.py input and
+    `results_path` its output. Error fallbacks are skipped.
+    """
+    pairs = []
+    if results_path is None:
+        with open(data_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    pairs.append((record.get("text"), record.get("emotion")))
+    else:
+        from batch_emotion import read_messages
+
+        emotions = {}
+        with open(results_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "emotion" in record:
+                    emotions[str(record["id"])] = record["emotion"]
+        for message_id, text in read_messages(data_path, text_fields, id_field):
+            pairs.append((text, emotions.get(message_id)))
+
+    texts, results = [], []
+    for text, emotion in pairs:
+        if not text or not isinstance(emotion, dict):
+            continue
+        if emotion.get("primary_emotion") in (None, "unknown") or not emotion.get("confidence"):
+            continue
+        texts.append(text)
+        results.append(emotion)
+    return texts, results
+
+
+def _normalise(value):
+    return str(value or "").strip().lower()
+
+
+def _fit_head(X, labels):
+    """Calibrated logistic regression over `labels`, with rare classes pooled; None if untrainable"""
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.linear_model import LogisticRegression
+
+    counts = Counter(labels)
+    y = np.array([label if counts[label] >= MIN_CLASS_EXAMPLES else RARE for label in labels])
+    # A pooled class too small to cross-validate is left out of training
+    keep = y != RARE if (y == RARE).sum() < MIN_CLASS_EXAMPLES else np.ones(len(y), dtype=bool)
+    if len(set(y[keep])) < 2:
+        return None
+    model = CalibratedClassifierCV(LogisticRegression(max_iter=1000), method="sigmoid", cv=3)
+    return model.fit(X[keep], y[keep])
+
+
+class EmotionClassifier:
+    """Predicts emotion_detection's output from sentence embeddings"""
+
+    def __init__(self, embedding_model, primary, intensity, risk, risk_labels, crisis, threshold=EMOTION_CLASSIFIER_THRESHOLD):
+        self.embedding_model = embedding_model
+        self.primary = primary
+        self.intensity = intensity
+        self.risk = risk
+        self.risk_labels = risk_labels
+        self.crisis = crisis
+        self.threshold = threshold
+        self.embeddings = None
+
+    @classmethod
+    def fit(cls, texts, emotions, embeddings, embedding_model=EMBEDDING_MODEL, threshold=EMOTION_CLASSIFIER_THRESHOLD):
+        from sklearn.calibration import CalibratedClassifierCV
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.multiclass import OneVsRestClassifier
+
+        X = np.asarray(embeddings.embed_documents(list(texts)), dtype=np.float32)
+        primary = _fit_head(X, [_normalise(e.get("primary_emotion")) for e in emotions])
+        intensity = _fit_head(X, [_normalise(e.get("intensity")) for e in emotions])
+
+        factors = [{_normalise(f) for f in e.get("risk_factors") or [] if _normalise(f)} for e in emotions]
+        counts = Counter(f for row in factors for f in row)
+        risk_labels = sorted(f for f, n in counts.items() if MIN_CLASS_EXAMPLES <= n <= len(emotions) - MIN_CLASS_EXAMPLES)
+        risk = None
+        if risk_labels:
+            Y = np.array([[label in row for label in risk_labels] for row in factors], dtype=int)
+            risk = OneVsRestClassifier(LogisticRegression(max_iter=1000, class_weight="balanced")).fit(X, Y)
+
+        # Calibrated, so CRISIS_PROBABILITY means the same thing whatever the base rate.
+        # Too few crisis examples leaves only the wording and risk-factor checks.
+        crisis_y = np.array([is_crisis(e) for e in emotions], dtype=int)
+        crisis = None
+        if MIN_CLASS_EXAMPLES <= crisis_y.sum() <= len(crisis_y) - MIN_CLASS_EXAMPLES:
+            crisis = CalibratedClassifierCV(
+                LogisticRegression(max_iter=1000, class_weight="balanced"), method="sigmoid", cv=3
+            ).fit(X, crisis_y)
+
+        model = cls(embedding_model, primary, intensity, risk, risk_labels, crisis, threshold)
+        model.embeddings = embeddings
+        return model
+
+    def predict(self, texts):
+        """Predictions with confidence and, when the LLM must decide, the reason why"""
+        texts = list(texts)
+        X = np.asarray(embed_queries(self.embeddings, texts), dtype=np.float32)
+        primary, primary_p = self._head(self.primary, X)
+        intensity, intensity_p = self._head(self.intensity, X)
+        risk = self.risk.predict_proba(X) if self.risk is not None else np.zeros((len(texts), 0))
+        crisis_p = self.crisis.predict_proba(X)[:, 1] if self.crisis is not None else np.zeros(len(texts))
+
+        predictions = []
+        for i, text in enumerate(texts):
+            factors = [label for label, p in zip(self.risk_labels, risk[i]) if p >= RISK_FACTOR_PROBABILITY]
+            confidence = float(min(primary_p[i], intensity_p[i]))
+            if CRISIS_TEXT.search(text) or crisis_p[i] >= CRISIS_PROBABILITY or any(CRISIS_LABEL.search(f) for f in factors):
+                defer = "crisis"
+            elif factors:
+                defer = "risk"
+            elif intensity[i] == "severe":
+                defer = "severe"
+            elif RARE in (primary[i], intensity[i]) or confidence == 0.0:
+                defer = "unknown_class"
+            else:
+                defer = None
+            predictions.append({
+                "result": {
+                    "primary_emotion": primary[i],
+                    # The LLM's secondary emotions are too open-ended to learn reliably
+                    "secondary_emotions": [],
+                    "intensity": intensity[i],
+                    "risk_factors": factors,
+                    "confidence": round(confidence, 3),
+                },
+                "confidence": confidence,
+                "defer": defer,
+            })
+        return predictions
+
+    def classify(self, text):
+        """emotion_detection-style result, or None when the message should go to the LLM"""
+        prediction = self.predict([text])[0]
+        if prediction["defer"] is None and prediction["confidence"] >= self.threshold:
+            return prediction["result"]
+        return None
+
+    @staticmethod
+    def _head(model, X):
+        if model is None:
+            return [RARE] * len(X), np.zeros(len(X))
+        probabilities = model.predict_proba(X)
+        best = probabilities.argmax(axis=1)
+        return [str(label) for label in model.classes_[best]], probabilities[np.arange(len(X)), best]
+
+    def save(self, path=EMOTION_CLASSIFIER_PATH):
+        import joblib
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # The threshold is a runtime setting (EMOTION_CLASSIFIER_THRESHOLD), not part of the model
+        state = {key: value for key, value in vars(self).items() if key not in ("embeddings", "threshold")}
+        joblib.dump(state, path)
+
+    @classmethod
+    def load(cls, embeddings, path=EMOTION_CLASSIFIER_PATH, embedding_model=EMBEDDING_MODEL, threshold=EMOTION_CLASSIFIER_THRESHOLD):
+        import joblib
+
+        state = joblib.load(path)
+        # Models saved before the threshold was left out
+        state["threshold"] = threshold
+        if state["embedding_model"] != embedding_model:
+            raise ValueError(
+                f"{path} was trained on {state['embedding_model']} embeddings, not {embedding_model}"
+            )
+        model = cls(**state)
+        model.embeddings = embeddings
+        return model
+
+
+_classifier = None
+_classifier_loaded = False
+_classifier_lock = threading.Lock()
+
+
+def get_emotion_classifier():
+    """The trained classifier, or None when disabled or not trained yet"""
+    global _classifier, _classifier_loaded
+
+    with _classifier_lock:
+        if not _classifier_loaded:
+            _classifier_loaded = True
+            if EMOTION_CLASSIFIER_ENABLED and os.path.exists(EMOTION_CLASSIFIER_PATH):
+                from embeddings import get_embeddings
+
+                try:
+                    _classifier = EmotionClassifier.load(get_embeddings())
+                except Exception as e:
+                    print(f"Warning: local emotion classifier not used: {e}")
+    return _classifier
+
+
+def evaluate(texts, emotions, embeddings, thresholds, test_fraction=0.2, seed=0):
+    """Fit on a random split and report accuracy, crisis safety and LLM calls saved per threshold"""
+    order = np.random.default_rng(seed).permutation(len(texts))
+    cut = int(len(texts) * (1 - test_fraction))
+    train, test = order[:cut], order[cut:]
+    model = EmotionClassifier.fit([texts[i] for i in train], [emotions[i] for i in train], embeddings)
+
+    test_texts = [texts[i] for i in test]
+    truth = [emotions[i] for i in test]
+    start = time.perf_counter()
+    predictions = model.predict(test_texts)
+    batch_ms = (time.perf_counter() - start) * 1000 / max(len(test), 1)
+    start = time.perf_counter()
+    for text in test_texts[:20]:
+        model.predict([text])
+    single_ms = (time.perf_counter() - start) * 1000 / max(min(len(test), 20), 1)
+
+    def correct(prediction, emotion, field):
+        return prediction["result"][field] == _normalise(emotion.get(field))
+
+    crisis = [is_crisis(e) for e in truth]
+    flagged = sum(1 for p, c in zip(predictions, crisis) if c and p["defer"] == "crisis")
+    print(f"{len(train)} training / {len(test)} test messages")
+    print(f"primary_emotion accuracy (all): {np.mean([correct(p, e, 'primary_emotion') for p, e in zip(predictions, truth)]):.1%}")
+    print(f"intensity accuracy (all):       {np.mean([correct(p, e, 'intensity') for p, e in zip(predictions, truth)]):.1%}")
+    print(f"crisis messages flagged:        {flagged}/{sum(crisis)}")
+    print(f"latency: {batch_ms:.2f} ms/message batched, {single_ms:.2f} ms single\n")
+
+    print(f"{'threshold':>10}{'local':>8}{'primary acc':>13}{'intensity acc':>15}{'crisis local':>14}")
+    for threshold in thresholds:
+        local = [
+            i for i, p in enumerate(predictions)
+            if p["defer"] is None and p["confidence"] >= threshold
+        ]
+        primary = np.mean([correct(predictions[i], truth[i], "primary_emotion") for i in local]) if local else float("nan")
+        intensity = np.mean([correct(predictions[i], truth[i], "intensity") for i in local]) if local else float("nan")
+        crisis_local = sum(1 for i in local if crisis[i])
+        print(f"{threshold:>10.2f}{len(local) / max(len(test), 1):>8.0%}{primary:>13.1%}{intensity:>15.1%}{crisis_local:>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("data", help="JSONL of {text, emotion}, or the batch input when --results is given")
+    parser.add_argument("--results", help="batch_emotion.py output to join with the input by id")
+    parser.add_argument("--text-field", action="append", dest="text_fields", help="input text field (repeatable)")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--threshold", type=float, default=EMOTION_CLASSIFIER_THRESHOLD, help="evaluate: also report this threshold")
+    parser.add_argument("--output", default=EMOTION_CLASSIFIER_PATH, help="where train saves the model")
+    args = parser.parse_args()
+
+    from embeddings import get_embeddings
+
+    texts, emotions = load_examples(args.data, args.results, args.text_fields or ["text"], args.id_field)
+    print(f"Loaded {len(texts)} LLM-labelled messages")
+    if args.command == "evaluate":
+        thresholds = sorted({0.5, 0.6, 0.7, 0.8, 0.9, 0.95, args.threshold})
+        evaluate(texts, emotions, get_embeddings(), thresholds)
+        return
+
+    model = EmotionClassifier.fit(texts, emotions, get_embeddings())
+    model.save(args.output)
+    print(f"Saved to {args.output} (set the threshold with EMOTION_CLASSIFIER_THRESHOLD)")
+
+
+if __name__ == "__main__":
+    main()
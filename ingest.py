@@ -0,0 +1,150 @@
+"""Idempotent ingestion: deterministic chunk IDs and per-source diffs against a manifest"""
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass
+
+from config import CACHE_DIR
+
+
+# Fixed namespace so the same (source, chunk text) always maps to the same point ID
+CHUNK_ID_NAMESPACE = uuid.UUID("4dde1e49-339f-451a-aa6e-0b8827f9b905")
+
+
+def content_version(text):
+    """Short hash of a document's text, stored on its chunks next to their start_index.
+
+    Unchanged chunks keep their point (and metadata) when a page is edited,
+    so only chunks with the same version have offsets into the same text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_id(source, text):
+    """Deterministic point ID for a chunk of a given source"""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{source}\n{digest}"))
+
+
+class SourceManifest:
+    """Chunk IDs currently stored for each source of one collection.
+
+    Kept in a JSON file shared by all collections so re-ingesting a source
+    can be diffed against what is already in the vector store.
+    """
+
+    def __init__(self, collection_name, path=os.path.join(CACHE_DIR, "manifest.json")):
+        self.collection_name = collection_name
+        self.path = path
+        self._all = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._all = json.load(f)
+        self.sources = self._all.setdefault(collection_name, {})
+
+    def get(self, source):
+        return self.sources.get(source, [])
+
+    def set(self, source, ids):
+        self.sources[source] = list(ids)
+
+    def reset(self):
+        """Forget every source, e.g. after the collection was (re)created"""
+        self.sources.clear()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._all, f)
+        os.replace(tmp_path, self.path)
+
+
+@dataclass
+class SyncReport:
+    added: int = 0
+    unchanged: int = 0
+    removed: int = 0
+
+    def __add__(self, other):
+        return SyncReport(
+            self.added + other.added,
+            self.unchanged + other.unchanged,
+            self.removed + other.removed,
+        )
+
+    def summary(self):
+        return f"{self.added} added, {self.unchanged} unchanged, {self.removed} removed"
+
+
+@dataclass
+class SourcePlan:
+    """What has to change in the vector store to bring one source up to date"""
+    source: str
+    ids: list
+    new_ids: list
+    new_docs: list
+    removed_ids: list
+
+    @property
+    def report(self):
+        return SyncReport(
+            added=len(self.new_ids),
+            unchanged=len(self.ids) - len(self.new_ids),
+            removed=len(self.removed_ids),
+        )
+
+
+def plan_source(source, chunks, manifest):
+    """Diff the chunks of a source against the manifest"""
+    by_id = {}
+    for doc in chunks:
+        by_id.setdefault(chunk_id(source, doc.page_content), doc)
+
+    previous = set(manifest.get(source))
+    new_ids = [point_id for point_id in by_id if point_id not in previous]
+    return SourcePlan(
+        source=source,
+        ids=list(by_id),
+        new_ids=new_ids,
+        new_docs=[by_id[point_id] for point_id in new_ids],
+        removed_ids=sorted(previous - by_id.keys()),
+    )
+
+
+def unchanged_source(source, manifest):
+    """Plan for a source known not to have changed since it was last ingested"""
+    ids = manifest.get(source)
+    return SourcePlan(source=source, ids=list(ids), new_ids=[], new_docs=[], removed_ids=[])
+
+
+def group_by_source(docs):
+    """Group chunks by their `source` metadata, keeping first-seen order"""
+    groups = {}
+    for doc in docs:
+        groups.setdefault(doc.metadata.get("source", ""), []).append(doc)
+    return groups
+
+
+def upsert_vectors(vector_store, ids, docs, vectors):
+    """Write chunks with already computed embeddings, without re-embedding them"""
+    if hasattr(vector_store, "upsert_vectors"):
+        # Stores that take pre-computed vectors natively (LocalVectorStore)
+        vector_store.upsert_vectors(ids, docs, vectors)
+        return
+
+    from qdrant_client import models
+
+    points = [
+        models.PointStruct(
+            id=point_id,
+            vector={vector_store.vector_name: vector},
+            payload={
+                vector_store.content_payload_key: doc.page_content,
+                vector_store.metadata_payload_key: doc.metadata,
+            },
+        )
+        for point_id, doc, vector in zip(ids, docs, vectors)
+    ]
+    vector_store.client.upsert(collection_name=vector_store.collection_name, points=points)
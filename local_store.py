@@ -0,0 +1,561 @@
+"""Embedded vector index: memory-mapped NumPy vectors with exact and approximate search.
+
+An alternative to the Qdrant server for single-node deployments. Each
+collection is a directory holding
+
+- vectors.f32          normalised float32 vectors, one row per chunk (memory-mapped)
+- codes.i8/scales.f32  optional int8-quantised copy with per-row scales
+- log.jsonl            append-only log of upserted documents and deletions
+- ivf.npz              optional approximate (IVF) index over the vectors
+
+Deleted rows and overwritten log entries are garbage; once they make up
+`compact_fraction` of the log, both files are rewritten with only the live
+rows (see `compact`).
+
+Searches scan the contiguous matrix block by block (or only the IVF lists
+closest to the query), so nothing but the ids and log offsets has to live
+on the Python heap. The lock is only held to take a snapshot of the arrays
+and to read the documents of the results, so concurrent searches score in
+parallel (NumPy releases the GIL).
+"""
+import json
+import math
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from config import (
+    LOCAL_INDEX_ANN_MIN_ROWS,
+    LOCAL_INDEX_COMPACT_FRACTION,
+    LOCAL_INDEX_DIR,
+    LOCAL_INDEX_NPROBE,
+    LOCAL_INDEX_QUANTIZE,
+)
+
+
+_INITIAL_CAPACITY = 1024
+# Don't bother compacting for less garbage than this many log lines
+_COMPACT_MIN_GARBAGE = 1024
+# Rows scored per matrix multiply; bounds the temporary score/upcast buffers
+_BLOCK_ROWS = 16384
+# With int8 scanning, this many candidates per result are re-scored in float32
+_RESCORE_FACTOR = 4
+
+
+def _normalise(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, rows, k):
+    """Best `k` (rows, scores) from parallel arrays, highest score first"""
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        scores, rows = scores[keep], rows[keep]
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
+
+
+@dataclass
+class _Snapshot:
+    """The arrays a search reads, as of one moment"""
+    count: int
+    vectors: Any
+    codes: Any
+    scales: Any
+    live: Any
+    ivf: Any
+    generation: int
+
+
+class LocalVectorStore(VectorStore):
+    """LangChain vector store backed by memory-mapped NumPy files"""
+
+    def __init__(
+        self,
+        collection_name: str,
+        embedding: Embeddings,
+        path: Optional[str] = None,
+        quantize: bool = LOCAL_INDEX_QUANTIZE,
+        ann_min_rows: int = LOCAL_INDEX_ANN_MIN_ROWS,
+        nprobe: int = LOCAL_INDEX_NPROBE,
+        compact_fraction: float = LOCAL_INDEX_COMPACT_FRACTION,
+    ):
+        self.collection_name = collection_name
+        self._embeddings = embedding
+        self.path = path or os.path.join(LOCAL_INDEX_DIR, collection_name)
+        self.quantize = quantize
+        self.ann_min_rows = ann_min_rows
+        self.nprobe = nprobe
+        self.compact_fraction = compact_fraction
+
+        self._lock = threading.RLock()
+        self._dim = None
+        self._capacity = 0
+        self._ids = []      # row -> point id (None once deleted)
+        self._offsets = []  # row -> byte offset of its document in log.jsonl
+        self._rows = {}     # point id -> row
+        self._log_lines = 0
+        self._live = np.zeros(0, dtype=bool)
+        self._vectors = None
+        self._codes = None
+        self._scales = None
+        self._ivf = None
+        # Bumped whenever rows are renumbered, which invalidates snapshots
+        self._generation = 0
+        self._load()
+
+    @classmethod
+    def exists(cls, collection_name, path=None):
+        path = path or os.path.join(LOCAL_INDEX_DIR, collection_name)
+        return os.path.exists(os.path.join(path, "meta.json"))
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    def __len__(self):
+        return len(self._rows)
+
+    # -- writes -------------------------------------------------------------
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        docs = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        self.upsert_vectors(ids, docs, self._embeddings.embed_documents(texts))
+        return ids
+
+    def upsert_vectors(self, ids, docs, vectors):
+        """Insert or overwrite chunks whose embeddings are already computed"""
+        vectors = _normalise(vectors)
+        with self._lock:
+            if self._dim is None:
+                self._create(vectors.shape[1])
+            self._reserve(len(self._ids) + len(ids))
+            if not self.quantize and os.path.exists(self._file("codes.ready")):
+                # The int8 codes won't cover these rows; rebuild them if re-enabled
+                os.remove(self._file("codes.ready"))
+
+            with open(self._file("log.jsonl"), "ab") as log:
+                for point_id, doc, vector in zip(ids, docs, vectors):
+                    row = self._rows.get(point_id)
+                    if row is None:
+                        row = len(self._ids)
+                        self._ids.append(point_id)
+                        self._offsets.append(0)
+                        self._rows[point_id] = row
+                    self._offsets[row] = log.tell()
+                    entry = {"row": row, "id": point_id, "page_content": doc.page_content, "metadata": doc.metadata}
+                    log.write((json.dumps(entry, default=str) + "\n").encode("utf-8"))
+                    self._write_row(row, vector)
+            self._log_lines += len(ids)
+            self._flush()
+            self._maybe_compact()
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids or self._dim is None:
+            return False
+        with self._lock:
+            with open(self._file("log.jsonl"), "ab") as log:
+                for point_id in ids:
+                    row = self._rows.pop(point_id, None)
+                    if row is None:
+                        continue
+                    self._ids[row] = None
+                    self._live[row] = False
+                    log.write((json.dumps({"delete": point_id}) + "\n").encode("utf-8"))
+                    self._log_lines += 1
+            self._maybe_compact()
+        return True
+
+    # -- compaction -----------------------------------------------------------
+
+    def _maybe_compact(self):
+        garbage = self._log_lines - len(self._rows)
+        if (
+            self.compact_fraction
+            and garbage >= _COMPACT_MIN_GARBAGE
+            and garbage >= self.compact_fraction * self._log_lines
+        ):
+            self.compact()
+
+    def compact(self):
+        """Rewrite vectors.f32 and log.jsonl with only the live rows, renumbered.
+
+        The new files are written next to the old ones and swapped in once
+        complete; compact.ready marks a finished rewrite, so `_load` can
+        roll an interrupted swap forward.
+        """
+        with self._lock:
+            if self._dim is None:
+                return
+            rows = sorted(self._rows.values())
+            capacity = max(len(rows), _INITIAL_CAPACITY)
+
+            vectors = np.memmap(self._file("vectors.f32.tmp"), dtype=np.float32, mode="w+", shape=(capacity, self._dim))
+            for start in range(0, len(rows), _BLOCK_ROWS):
+                block = rows[start:start + _BLOCK_ROWS]
+                vectors[start:start + len(block)] = self._vectors[block]
+            vectors.flush()
+            del vectors
+
+            ids, offsets = [], []
+            with open(self._file("log.jsonl"), "rb") as old, open(self._file("log.jsonl.tmp"), "wb") as new:
+                for new_row, row in enumerate(rows):
+                    old.seek(self._offsets[row])
+                    entry = json.loads(old.readline())
+                    entry["row"] = new_row
+                    ids.append(entry["id"])
+                    offsets.append(new.tell())
+                    new.write((json.dumps(entry) + "\n").encode("utf-8"))
+                new.flush()
+                os.fsync(new.fileno())
+
+            open(self._file("compact.ready"), "w").close()
+            self._finish_compaction()
+
+            self._ids = ids
+            self._offsets = offsets
+            self._rows = {point_id: row for row, point_id in enumerate(ids)}
+            self._log_lines = len(ids)
+            self._live = np.ones(len(ids), dtype=bool)
+            self._vectors = self._codes = self._scales = None
+            self._ivf = None
+            self._open_arrays(capacity)
+            self._generation += 1
+
+    def _finish_compaction(self):
+        """Swap the rewritten files in and drop what indexes the old row numbers"""
+        for name in ("ivf.npz", "codes.ready"):
+            if os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+        for name in ("vectors.f32", "log.jsonl"):
+            if os.path.exists(self._file(name + ".tmp")):
+                os.replace(self._file(name + ".tmp"), self._file(name))
+        os.remove(self._file("compact.ready"))
+
+    # -- reads --------------------------------------------------------------
+
+    def get_by_ids(self, ids, /) -> List[Document]:
+        with self._lock:
+            rows = [self._rows[point_id] for point_id in ids if point_id in self._rows]
+            if not rows:
+                return []
+            with open(self._file("log.jsonl"), "rb") as log:
+                return [self._document(log, row) for row in rows]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embeddings.embed_query(query), k=k)
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any):
+        results = self.search_batch([self._embeddings.embed_query(query)], k)[0]
+        return [(doc, score) for _, score, doc in results]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for _, _, doc in self.search_batch([embedding], k)[0]]
+
+    def search_batch(self, vectors, k):
+        """Top-k search for several query vectors at once.
+
+        Returns one ranked list of (point_id, score, Document) per vector.
+        """
+        queries = _normalise(vectors)
+        while True:
+            snapshot = self._snapshot()
+            if snapshot is None:
+                return [[] for _ in queries]
+            if snapshot.ivf is not None:
+                hits = [self._search_ivf(snapshot, query, k) for query in queries]
+            else:
+                hits = self._search_exact(snapshot, queries, k)
+
+            with self._lock:
+                if self._generation != snapshot.generation:
+                    # Rows were renumbered meanwhile: search again
+                    continue
+                with open(self._file("log.jsonl"), "rb") as log:
+                    # Rows deleted since the snapshot are left out
+                    return [
+                        [
+                            (self._ids[row], float(score), self._document(log, row))
+                            for row, score in zip(rows, scores)
+                            if self._ids[row] is not None
+                        ]
+                        for rows, scores in hits
+                    ]
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        collection_name: str = "default",
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(collection_name, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    # -- search -------------------------------------------------------------
+
+    def _snapshot(self):
+        """The arrays to search, or None if the collection is empty"""
+        with self._lock:
+            if not self._rows:
+                return None
+            ivf = None
+            if self.ann_min_rows and len(self._rows) >= self.ann_min_rows:
+                if self._ivf is None or self._ivf_is_stale():
+                    self.build_ann_index()
+                ivf = self._ivf
+            count = len(self._ids)
+            # Row data is only ever appended or overwritten in place, so views are
+            # enough; `live` is copied because deletes clear it
+            return _Snapshot(
+                count=count,
+                vectors=self._vectors,
+                codes=self._codes,
+                scales=self._scales,
+                live=self._live[:count].copy(),
+                ivf=ivf,
+                generation=self._generation,
+            )
+
+    def _scan_scores(self, snapshot, queries, start, end):
+        """Scores of rows [start, end) for every query, using int8 codes if enabled"""
+        if snapshot.codes is not None:
+            block = snapshot.codes[start:end].astype(np.float32)
+            scores = (queries @ block.T) * snapshot.scales[start:end]
+        else:
+            scores = queries @ snapshot.vectors[start:end].T
+        scores[:, ~snapshot.live[start:end]] = -np.inf
+        return scores
+
+    def _search_exact(self, snapshot, queries, k):
+        count = snapshot.count
+        keep = k * _RESCORE_FACTOR if self.quantize else k
+        best_rows = [np.empty(0, dtype=np.int64) for _ in queries]
+        best_scores = [np.empty(0, dtype=np.float32) for _ in queries]
+
+        for start in range(0, count, _BLOCK_ROWS):
+            end = min(start + _BLOCK_ROWS, count)
+            block_scores = self._scan_scores(snapshot, queries, start, end)
+            block_rows = np.arange(start, end)
+            for i in range(len(queries)):
+                best_rows[i], best_scores[i] = _top_k(
+                    np.concatenate([best_scores[i], block_scores[i]]),
+                    np.concatenate([best_rows[i], block_rows]),
+                    keep,
+                )
+
+        return [
+            self._finish(snapshot, query, rows, scores, k)
+            for query, rows, scores in zip(queries, best_rows, best_scores)
+        ]
+
+    def _search_ivf(self, snapshot, query, k):
+        centroids, lists, indexed_rows = snapshot.ivf
+        nprobe = min(self.nprobe, len(centroids))
+        probe = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        # Rows added after the index was built are scanned exhaustively
+        tail = np.arange(indexed_rows, snapshot.count)
+        candidates = np.concatenate([lists[i] for i in probe] + [tail])
+        # Sorted so the memory-mapped rows are read front to back
+        candidates = np.sort(candidates[snapshot.live[candidates]])
+        if not len(candidates):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = snapshot.vectors[candidates] @ query
+        return _top_k(scores, candidates, k)
+
+    def _finish(self, snapshot, query, rows, scores, k):
+        rows, scores = rows[np.isfinite(scores)], scores[np.isfinite(scores)]
+        if snapshot.codes is not None and len(rows):
+            # Re-rank the int8 candidates with the exact float32 vectors
+            rows = np.sort(rows)
+            scores = snapshot.vectors[rows] @ query
+        return _top_k(scores, rows, k)
+
+    # -- approximate index --------------------------------------------------
+
+    def build_ann_index(self, nlist=None, iterations=10, seed=0):
+        """Cluster the vectors (spherical k-means) into an inverted-file index"""
+        with self._lock:
+            count = len(self._ids)
+            rows = np.flatnonzero(self._live[:count])
+            if not len(rows):
+                return
+            nlist = min(nlist or int(math.sqrt(len(rows))), len(rows))
+            rng = np.random.default_rng(seed)
+
+            sample = np.sort(rng.choice(rows, size=min(len(rows), nlist * 40), replace=False))
+            centroids = self._vectors[sample[rng.choice(len(sample), nlist, replace=False)]]
+            for _ in range(iterations):
+                assign = np.argmax(self._vectors[sample] @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, self._vectors[sample])
+                empty = np.bincount(assign, minlength=nlist) == 0
+                sums[empty] = centroids[empty]
+                centroids = _normalise(sums)
+
+            assign = np.empty(count, dtype=np.int32)
+            for start in range(0, count, _BLOCK_ROWS):
+                end = min(start + _BLOCK_ROWS, count)
+                assign[start:end] = np.argmax(self._vectors[start:end] @ centroids.T, axis=1)
+
+            np.savez(self._file("ivf.npz"), centroids=centroids, assign=assign)
+            self._set_ivf(centroids, assign)
+
+    def _set_ivf(self, centroids, assign):
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+        lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+        self._ivf = (centroids, lists, len(assign))
+
+    def _ivf_is_stale(self):
+        # Rebuild once a quarter of the rows are not covered by the clustering
+        return len(self._ids) - self._ivf[2] > self._ivf[2] // 4
+
+    # -- storage ------------------------------------------------------------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _create(self, dim):
+        os.makedirs(self.path, exist_ok=True)
+        self._dim = dim
+        self._open_arrays(_INITIAL_CAPACITY)
+        # Written last (and atomically): meta.json marks a complete collection
+        tmp_path = self._file("meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": dim}, f)
+        os.replace(tmp_path, self._file("meta.json"))
+
+    def _load(self):
+        if not self.exists(self.collection_name, self.path):
+            return
+        with open(self._file("meta.json"), encoding="utf-8") as f:
+            self._dim = json.load(f)["dim"]
+        if os.path.exists(self._file("compact.ready")):
+            self._finish_compaction()
+        for name in ("vectors.f32.tmp", "log.jsonl.tmp"):
+            # Left by a compaction that did not finish writing: the old files still hold
+            if os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+        if not os.path.exists(self._file("vectors.f32")):
+            # Cut short before any vector was written (collections created
+            # before meta.json was written last): whatever the log says has
+            # no vectors behind it, so start empty
+            for name in ("log.jsonl", "ivf.npz", "codes.ready"):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            self._open_arrays(_INITIAL_CAPACITY)
+            return
+
+        if os.path.exists(self._file("log.jsonl")):
+            with open(self._file("log.jsonl"), "rb") as log:
+                offset = 0
+                for line in log:
+                    entry = json.loads(line)
+                    if "delete" in entry:
+                        row = self._rows.pop(entry["delete"], None)
+                        if row is not None:
+                            self._ids[row] = None
+                    else:
+                        row = entry["row"]
+                        while len(self._ids) <= row:
+                            self._ids.append(None)
+                            self._offsets.append(0)
+                        self._ids[row] = entry["id"]
+                        self._offsets[row] = offset
+                        self._rows[entry["id"]] = row
+                    offset += len(line)
+                    self._log_lines += 1
+
+        capacity = os.path.getsize(self._file("vectors.f32")) // (4 * self._dim)
+        self._open_arrays(max(capacity, _INITIAL_CAPACITY))
+        self._live[:len(self._ids)] = [point_id is not None for point_id in self._ids]
+
+        if os.path.exists(self._file("ivf.npz")):
+            ivf = np.load(self._file("ivf.npz"))
+            if len(ivf["assign"]) <= len(self._ids):
+                self._set_ivf(ivf["centroids"], ivf["assign"])
+
+    def _open_arrays(self, capacity):
+        """(Re)map the vector files with room for `capacity` rows"""
+        self._flush()
+        self._vectors = self._map("vectors.f32", np.float32, (capacity, self._dim))
+        if self.quantize:
+            self._codes = self._map("codes.i8", np.int8, (capacity, self._dim))
+            self._scales = self._map("scales.f32", np.float32, (capacity,))
+            if not os.path.exists(self._file("codes.ready")):
+                # Quantisation switched on for an existing index: build the codes once
+                for row in range(len(self._ids)):
+                    self._write_codes(row, self._vectors[row])
+                open(self._file("codes.ready"), "w").close()
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live[:capacity]
+        self._live = live
+        self._capacity = capacity
+
+    def _map(self, name, dtype, shape):
+        path = self._file(name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _reserve(self, rows):
+        if rows > self._capacity:
+            capacity = self._capacity
+            while capacity < rows:
+                capacity *= 2
+            self._open_arrays(capacity)
+
+    def _write_row(self, row, vector):
+        self._vectors[row] = vector
+        self._live[row] = True
+        if self.quantize:
+            self._write_codes(row, vector)
+
+    def _write_codes(self, row, vector):
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        self._codes[row] = np.round(vector / scale).astype(np.int8)
+        self._scales[row] = scale
+
+    def _flush(self):
+        for array in (self._vectors, self._codes, self._scales):
+            if array is not None:
+                array.flush()
+
+    def _document(self, log, row):
+        log.seek(self._offsets[row])
+        entry = json.loads(log.readline())
+        metadata = dict(entry["metadata"] or {})
+        metadata["_id"] = entry["id"]
+        metadata["_collection_name"] = self.collection_name
+        return Document(page_content=entry["page_content"], metadata=metadata)
@@ -0,0 +1,189 @@
+"""Token-budgeted conversation memory for the agent.
+
+The prompt is laid out so that it changes as little as possible between
+turns:
+
+    [system prompt + few-shot example]   fixed prefix, never edited
+    [summary of older turns]             rewritten only when turns are folded in
+    [recent turns, verbatim]             appended to every turn
+
+Provider-side prompt caching matches on the longest unchanged prefix, so
+the fixed part (by far the largest) is always a hit. Once the history
+(summary plus turns) goes over the token budget, every turn but the most
+recent few is folded into the running summary in one go. The summary
+therefore changes every few turns, not on every turn, and prompt size
+stays flat however long the session runs. Folding runs on a background
+thread after a turn is stored, while the user is reading and typing.
+"""
+import math
+import re
+import threading
+
+from config import MEMORY_RECENT_TURNS, MEMORY_SUMMARY_TOKENS, MEMORY_TOKEN_BUDGET
+from metrics import get_metrics, stage
+
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and a mental health assistant.
+
+Current summary:
+{summary}
+
+New turns to fold in:
+{turns}
+
+Keep what matters for later turns: the user's situation and concerns, their
+emotional state and any risk indicators, and the advice already given. Write
+plain prose of at most {words} words and reply with the summary only."""
+
+# Roughly four characters per token for English text; words and punctuation
+# marks are counted too, so short words and symbols are not undercounted
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = re.compile(r"[.!?](?=\s)|\n")
+
+
+def count_tokens(text):
+    """Estimated token count of `text` (no tokenizer download, close enough for budgets)"""
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), math.ceil(len(_TOKEN_PIECES.findall(text)) * 0.75))
+
+
+def cut_at_sentence(text, max_tokens):
+    """Longest start of `text` within `max_tokens`, ending at a sentence end (or else a word)"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max_tokens * 4]
+    ends = [match.end() for match in SENTENCE_END.finditer(cut)]
+    if not ends:
+        ends = [match.start() for match in re.finditer(r"\s", cut)]
+    while ends and count_tokens(cut[:ends[-1]]) > max_tokens:
+        ends.pop()
+    return cut[:ends[-1]].strip() if ends else ""
+
+
+def message_tokens(message):
+    # A few tokens of per-message overhead for the role and separators
+    return count_tokens(str(message.get("content", ""))) + 4
+
+
+def llm_summarizer(client, model):
+    """Summarizer calling an OpenAI-compatible chat endpoint"""
+    def summarize(summary, turns, max_tokens):
+        text = "\n".join(f"{message['role']}: {message['content']}" for turn in turns for message in turn)
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(none yet)", turns=text, words=int(max_tokens * 0.75))
+        with stage("memory_summary") as fields:
+            response = client.chat.completions.create(
+                model=model,
+                n=1,
+                messages=[{"role": "user", "content": prompt}],
+            )
+            if response.usage is not None:
+                fields["prompt_tokens"] = response.usage.prompt_tokens
+                fields["completion_tokens"] = response.usage.completion_tokens
+        return response.choices[0].message.content.strip()
+
+    return summarize
+
+
+class ConversationMemory:
+    """Fixed prompt prefix, a running summary and the most recent turns, within a token budget.
+
+    `budget` bounds the history (summary plus stored turns); the prefix is
+    constant and not part of it. Without a summarizer, or when it fails,
+    folded turns are simply dropped.
+    """
+
+    def __init__(
+        self,
+        prefix,
+        summarizer=None,
+        budget=MEMORY_TOKEN_BUDGET,
+        recent_turns=MEMORY_RECENT_TURNS,
+        summary_tokens=MEMORY_SUMMARY_TOKENS,
+    ):
+        self.prefix = list(prefix)
+        self.summarizer = summarizer
+        self.budget = budget
+        self.recent_turns = max(1, recent_turns)
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        self.turns = []
+        self.folded = 0
+        self.prefix_tokens = sum(message_tokens(message) for message in self.prefix)
+        self._lock = threading.Lock()
+        self._compacting = None
+
+    def messages(self):
+        """Chat messages for the next model call (waits for a pending fold)"""
+        self._wait()
+        with self._lock:
+            return [*self.prefix, *self._summary_messages(), *(m for turn in self.turns for m in turn)]
+
+    def add_turn(self, user, assistant, background=True):
+        """Store a finished turn; folds older turns if the history is over budget"""
+        self._wait()
+        with self._lock:
+            self.turns.append([{"role": "user", "content": user}, {"role": "assistant", "content": assistant}])
+            if self._history_tokens() <= self.budget:
+                return
+        if background:
+            self._compacting = threading.Thread(target=self._compact, name="memory-compact", daemon=True)
+            self._compacting.start()
+        else:
+            self._compact()
+
+    def history_tokens(self):
+        with self._lock:
+            return self._history_tokens()
+
+    def prompt_tokens(self, message=""):
+        """Estimated prompt size for a next user message `message`"""
+        return self.prefix_tokens + self.history_tokens() + message_tokens({"content": message})
+
+    def _summary_messages(self):
+        if not self.summary:
+            return []
+        # A user message, not a second system message: providers merge system
+        # messages into the instruction, which would change the cached prefix
+        return [{"role": "user", "content": f"(Summary of our earlier conversation, for context: {self.summary})"}]
+
+    def _history_tokens(self):
+        messages = [*self._summary_messages(), *(m for turn in self.turns for m in turn)]
+        return sum(message_tokens(message) for message in messages)
+
+    def _wait(self):
+        if self._compacting is not None:
+            self._compacting.join()
+            self._compacting = None
+
+    def _compact(self):
+        with self._lock:
+            turns = list(self.turns)
+        # Fold all but the recent turns, more if those alone are over budget
+        # (the newest turn always stays verbatim)
+        keep = min(self.recent_turns, len(turns))
+        room = self.budget - self.summary_tokens - 8
+        while keep > 1 and sum(message_tokens(m) for turn in turns[-keep:] for m in turn) > room:
+            keep -= 1
+        fold = turns[:len(turns) - keep]
+        if not fold:
+            return
+
+        summary = self.summary
+        with stage("memory_compact", turns=len(fold)) as fields:
+            if self.summarizer is not None:
+                try:
+                    summary = self.summarizer(self.summary, fold, self.summary_tokens)
+                except Exception as e:
+                    fields["error"] = type(e).__name__
+                    get_metrics().increment("memory_evicted_turns_total", len(fold))
+            else:
+                get_metrics().increment("memory_evicted_turns_total", len(fold))
+            # Models overshoot word limits; the summary must not eat the budget
+            summary = cut_at_sentence(summary, self.summary_tokens)
+            fields["summary_tokens"] = count_tokens(summary)
+
+        with self._lock:
+            self.summary = summary
+            self.turns = self.turns[len(fold):]
+            self.folded += len(fold)
@@ -0,0 +1,325 @@
+"""Per-stage latency histograms, counters and structured logs for RAG and ingest steps.
+
+Every timed stage (embedding, vector search, prompt formatting, LLM calls,
+fetching, cleanup, splitting, upserts, ...) lands in one latency histogram
+labelled with the stage name. Numeric fields attached to a stage (bytes,
+chunks, tokens, ...) are summed into `<field>_total` counters. Recording
+is a perf_counter call and a locked bucket increment, cheap enough to stay
+on; JSON logging, the HTTP endpoint and the file dump are opt-in.
+"""
+import atexit
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import METRICS_DUMP_FILE, METRICS_LOG_FILE, METRICS_PORT
+
+
+# Latency bucket upper bounds in seconds (Prometheus "le" labels)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger("rag.metrics")
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Process-wide store of stage histograms and counters"""
+
+    def __init__(self, prefix="rag", buckets=LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, stage, seconds, **fields):
+        """Record one run of a stage; numeric fields are added to `<field>_total{stage}`"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            for name, value in fields.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    key = (f"{name}_total", (("stage", stage),))
+                    self._counters[key] = self._counters.get(key, 0) + value
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("stage", extra={"fields": {"stage": stage, "duration_ms": round(seconds * 1000, 3), **fields}})
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """Time the enclosed block as `name`; the yielded dict takes extra fields"""
+        start = time.perf_counter()
+        try:
+            yield fields
+        except Exception as e:
+            fields["error"] = type(e).__name__
+            self.increment("errors_total", stage=name)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **fields)
+
+    def render(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            name = f"{self.prefix}_stage_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+            for counter in sorted({key[0] for key in self._counters}):
+                lines.append(f"# TYPE {self.prefix}_{counter} counter")
+                for (name, labels), value in sorted(self._counters.items()):
+                    if name == counter:
+                        label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                        lines.append(f"{self.prefix}_{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Human-readable table of stage counts and latencies"""
+        with self._lock:
+            rows = sorted(self._histograms.items(), key=lambda item: item[1].sum, reverse=True)
+            lines = [f"{'stage':<32}{'count':>7}{'mean ms':>10}{'p50 ≤ ms':>10}{'p95 ≤ ms':>10}"]
+            for stage, h in rows:
+                lines.append(
+                    f"{stage:<32}{h.count:>7}{h.sum / h.count * 1000:>10.1f}"
+                    f"{h.quantile(0.5) * 1000:>10.0f}{h.quantile(0.95) * 1000:>10.0f}"
+                )
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """Write the Prometheus text to `path` (atomically, for node_exporter's textfile collector)"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Expose GET /metrics on a background thread; returns the server"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    """Return the process-wide metrics registry"""
+    return _registry
+
+
+def stage(name, **fields):
+    """Shortcut for get_metrics().stage(...)"""
+    return _registry.stage(name, **fields)
+
+
+def instrumented(name):
+    """Decorator timing every call of a function as stage `name`"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _registry.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per log record, with any `fields` passed via `extra`"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_metrics(log_file=METRICS_LOG_FILE, port=METRICS_PORT, dump_file=METRICS_DUMP_FILE):
+    """Turn on the optional outputs: JSON stage log, /metrics endpoint, dump on exit"""
+    if log_file:
+        handler = logging.FileHandler(log_file, encoding="utf-8")
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    if port:
+        _registry.serve(port)
+    if dump_file:
+        atexit.register(_registry.dump, dump_file)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """LangChain callback handler recording every chain, retriever and LLM run.
+
+    Runs are recorded as `chain:<name>` (prompt templates, output parsers,
+    lambdas, ...), `retriever:<name>` and `llm:<name>`, plus the time to the
+    first streamed token as `llm_first_token:<name>` and token counts.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or _registry
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, kind, serialized, kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "unknown"
+        with self._lock:
+            self._runs[run_id] = [f"{kind}:{name}", time.perf_counter(), 0]
+
+    def _end(self, run_id, **fields):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is not None:
+            self.registry.observe(run[0], time.perf_counter() - run[1], **fields)
+        return run
+
+    def _error(self, run_id):
+        run = self._end(run_id, error=True)
+        if run is not None:
+            self.registry.increment("errors_total", stage=run[0])
+
+    # -- chains (prompt formatting, parsers, sequences) ----------------------
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        self._start(run_id, "chain", serialized, kwargs)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._error(run_id)
+
+    # -- retrievers ----------------------------------------------------------
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "retriever", serialized, kwargs)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._error(run_id)
+
+    # -- LLMs ----------------------------------------------------------------
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "llm", serialized, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "llm", serialized, kwargs)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return
+            run[2] += 1
+            first = run[2] == 1
+        if first:
+            stage = run[0].replace("llm:", "llm_first_token:", 1)
+            self.registry.observe(stage, time.perf_counter() - run[1])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            streamed = self._runs.get(run_id, [None, None, 0])[2]
+        self._end(run_id, **_token_usage(response, streamed))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._error(run_id)
+
+
+def _token_usage(response, streamed_tokens):
+    """Prompt/completion token counts from an LLMResult, whichever way the provider reports them"""
+    usage = (response.llm_output or {}).get("token_usage") or (response.llm_output or {}).get("usage") or {}
+    prompt = usage.get("prompt_tokens") or usage.get("input_tokens")
+    completion = usage.get("completion_tokens") or usage.get("output_tokens")
+
+    if prompt is None and completion is None:
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                if metadata:
+                    prompt = (prompt or 0) + metadata.get("input_tokens", 0)
+                    completion = (completion or 0) + metadata.get("output_tokens", 0)
+
+    fields = {}
+    if prompt is not None:
+        fields["prompt_tokens"] = prompt
+    if completion is not None:
+        fields["completion_tokens"] = completion
+    elif streamed_tokens:
+        # Provider reported nothing: count streamed chunks (roughly one token each)
+        fields["completion_tokens"] = streamed_tokens
+    return fields
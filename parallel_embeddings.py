@@ -0,0 +1,229 @@
+"""Ingest-side document embedding on a pool of worker processes.
+
+A single process running a small model like MiniLM leaves most cores of a
+CPU-only node idle: batches are short, and torch's intra-op threads spend
+much of their time handing work around. Instead, every worker process
+loads its own copy of the model and runs it with a fixed, small number of
+torch threads (EMBED_THREADS_PER_WORKER). Chunks are sharded across the
+workers.
+
+Texts are sorted by length before sharding, so each forward pass of
+EMBED_MODEL_BATCH_SIZE texts pads to a similar length and little compute
+is wasted on padding. The longest shards are handed out first, which also
+balances the load. Vectors come back in the caller's order.
+
+Starting the pool costs a model load per worker, so it is started on the
+first call with at least EMBED_MIN_PARALLEL texts. Smaller calls (adding a
+single URL, for example) are embedded in-process. Every worker holds a
+model copy, so the pool is shut down after each ingest (close_ingest_pool)
+rather than kept for the session.
+"""
+import atexit
+import functools
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from langchain_core.embeddings import Embeddings
+
+from config import (
+    EMBED_MIN_PARALLEL,
+    EMBED_MODEL_BATCH_SIZE,
+    EMBED_THREADS_PER_WORKER,
+    EMBED_WORKERS,
+    EMBEDDING_MODEL,
+)
+from metrics import stage
+
+
+# Shards per worker and call: enough for the longest-first order to even out the load
+SHARDS_PER_WORKER = 4
+# Texts per worker in one pipeline embed call, in units of the model batch size
+DISPATCH_BATCHES_PER_WORKER = 8
+
+
+def huggingface_embeddings(model_name, batch_size):
+    """The same embeddings get_embeddings() uses, with the given forward-pass batch size"""
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": batch_size})
+
+
+_worker_model = None
+
+
+def _init_worker(factory, batch_size, threads):
+    global _worker_model
+
+    # Before torch is imported, so its OpenMP/MKL pools are sized accordingly too
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    try:
+        import torch
+    except ImportError:
+        pass
+    else:
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Already set: only allowed once per process
+            pass
+    _worker_model = factory(batch_size)
+
+
+def _embed_shard(texts):
+    return _worker_model.embed_documents(texts)
+
+
+class ParallelEmbeddings(Embeddings):
+    """Embed documents on `workers` processes, each running `factory(batch_size)`.
+
+    `local` embeds calls under `min_parallel` texts in-process (by default
+    another model built from the factory). Queries are not this class's
+    job; they go through the shared in-process model.
+    """
+
+    def __init__(
+        self,
+        factory=None,
+        workers=EMBED_WORKERS,
+        threads_per_worker=EMBED_THREADS_PER_WORKER,
+        batch_size=EMBED_MODEL_BATCH_SIZE,
+        min_parallel=EMBED_MIN_PARALLEL,
+        local=None,
+        sort_by_length=True,
+    ):
+        cores = os.cpu_count() or 1
+        self.factory = factory or functools.partial(huggingface_embeddings, EMBEDDING_MODEL)
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker or max(1, cores // self.workers)
+        self.batch_size = batch_size
+        self.min_parallel = min_parallel
+        self.sort_by_length = sort_by_length
+        self._local = local
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def dispatch_size(self):
+        """Texts per embed_documents call that keep every worker busy"""
+        return self.workers * self.batch_size * DISPATCH_BATCHES_PER_WORKER
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        order = list(range(len(texts)))
+        if self.sort_by_length:
+            order.sort(key=lambda i: len(texts[i]), reverse=True)
+
+        if self.workers <= 1 or len(texts) < max(self.min_parallel, 1):
+            vectors = [None] * len(texts)
+            for i, vector in zip(order, self._local_model().embed_documents([texts[i] for i in order])):
+                vectors[i] = vector
+            return vectors
+
+        # Whole model batches per shard, so only the last forward pass is partial
+        batches = math.ceil(len(texts) / (self.workers * SHARDS_PER_WORKER * self.batch_size))
+        shard_size = max(1, batches) * self.batch_size
+        shards = [order[start:start + shard_size] for start in range(0, len(order), shard_size)]
+
+        vectors = [None] * len(texts)
+        with stage("embed_parallel", texts=len(texts), shards=len(shards)):
+            results = self._map([[texts[i] for i in shard] for shard in shards])
+            for shard, shard_vectors in zip(shards, results):
+                for i, vector in zip(shard, shard_vectors):
+                    vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self._local_model().embed_query(text)
+
+    def start(self):
+        """Start the workers and load the model in each (otherwise done on first use)"""
+        self._map([["warm-up"]] * self.workers)
+        return self
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def _map(self, shards):
+        pool = self._get_pool()
+        try:
+            return list(pool.map(_embed_shard, shards))
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for running out of memory): start afresh next time
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def _local_model(self):
+        with self._lock:
+            if self._local is None:
+                self._local = self.factory(self.batch_size)
+            return self._local
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: forking a process that has torch threads running can deadlock
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.factory, self.batch_size, self.threads_per_worker),
+                )
+            return self._pool
+
+
+_ingest_embeddings = None
+_ingest_embeddings_lock = threading.Lock()
+
+
+def get_ingest_embeddings():
+    """Embeddings for ingestion: the shared provider, backed by a process pool when EMBED_WORKERS allows.
+
+    Shares the shared provider's vector cache, so chunks embedded either
+    way are never embedded again. A provider swapped in with set_embeddings
+    (another model) is used as is: the workers could not reproduce its vectors.
+    """
+    global _ingest_embeddings
+
+    from embeddings import CachedEmbeddings, get_embeddings
+
+    shared = get_embeddings()
+    workers = min(EMBED_WORKERS, os.cpu_count() or 1)
+    with _ingest_embeddings_lock:
+        if (
+            workers <= 1
+            or not isinstance(shared, CachedEmbeddings)
+            or shared.model_name != EMBEDDING_MODEL
+        ):
+            return shared
+        if _ingest_embeddings is None or _ingest_embeddings.cache is not shared.cache:
+            engine = ParallelEmbeddings(workers=workers, local=shared.embeddings)
+            atexit.register(engine.close)
+            _ingest_embeddings = CachedEmbeddings(engine, shared.model_name, shared.cache)
+        return _ingest_embeddings
+
+
+def close_ingest_pool(embeddings):
+    """Stop the worker processes behind `embeddings`, if any (restarted on the next large ingest)"""
+    engine = getattr(embeddings, "embeddings", embeddings)
+    if isinstance(engine, ParallelEmbeddings):
+        engine.close()
+
+
+def ingest_batch_size(embeddings, default):
+    """Chunks per pipeline embed call for `embeddings` (larger for a process pool)"""
+    engine = getattr(embeddings, "embeddings", embeddings)
+    if isinstance(engine, ParallelEmbeddings) and engine.workers > 1:
+        return max(default, engine.dispatch_size)
+    return default
@@ -0,0 +1,318 @@
+"""Streaming ingestion pipeline: fetch → clean → split → embed → upsert.
+
+Each stage runs on its own thread and hands work to the next one through a
+small bounded queue, so stages overlap (batch N is embedded while batch N+1
+is still being fetched and split) and a slow stage holds the faster ones
+back. Only a few pages and batches are ever in flight, which keeps peak
+memory flat regardless of how many URLs are ingested.
+"""
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from config import (
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    EMBED_BATCH_SIZE,
+    PIPELINE_QUEUE_DEPTH,
+    UPSERT_BATCH_SIZE,
+)
+from ingest import (
+    SyncReport,
+    content_version,
+    group_by_source,
+    plan_source,
+    unchanged_source,
+    upsert_vectors,
+)
+from metrics import stage
+from web_loader import AsyncWebLoader, HttpCache
+
+
+_END = object()
+
+
+class _Stopped(Exception):
+    """Raised inside a stage once another stage has failed"""
+
+
+class _Buffer:
+    """Collects items into fixed-size batches.
+
+    Source markers are held back until every item queued before them has
+    been flushed, so a source is only committed once all of its chunks have
+    gone through the stage.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.items = []
+        self.markers = deque()
+        self.added = 0
+        self.flushed = 0
+
+    def add(self, items):
+        self.items.extend(items)
+        self.added += len(items)
+
+    def mark(self, marker):
+        self.markers.append((self.added, marker))
+
+    def drain(self, final=False):
+        """Yield ("batch", items) and ("source", marker) in pipeline order"""
+        while len(self.items) >= self.size or (final and self.items):
+            batch = self.items[:self.size]
+            del self.items[:self.size]
+            self.flushed += len(batch)
+            yield "batch", batch
+            yield from self._release()
+        yield from self._release()
+
+    def _release(self):
+        while self.markers and self.markers[0][0] <= self.flushed:
+            yield "source", self.markers.popleft()[1]
+
+
+class _SourceValidators:
+    """The loader's view of the HTTP cache for one collection.
+
+    Validators are only sent for sources the manifest holds, and only
+    stored once their source is committed: a page that failed to embed or
+    upsert must not come back as 304 Not Modified next time.
+    """
+
+    def __init__(self, http_cache, manifest):
+        self.http_cache = http_cache
+        self.manifest = manifest
+        self.pending = {}
+
+    def get(self, url):
+        if not self.manifest.get(url):
+            return None
+        return self.http_cache.get(self.manifest.collection_name, url)
+
+    def put(self, url, etag, last_modified):
+        self.pending[url] = (etag, last_modified)
+
+    def commit(self, url):
+        if url in self.pending:
+            self.http_cache.put(self.manifest.collection_name, url, *self.pending.pop(url))
+
+    def forget(self, url):
+        self.pending.pop(url, None)
+        self.http_cache.put(self.manifest.collection_name, url, None, None)
+
+
+@dataclass
+class PipelineStats:
+    sources: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    report: SyncReport = field(default_factory=SyncReport)
+    started: float = field(default_factory=time.perf_counter)
+    finished: float = 0.0
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self):
+        rate = self.chunks / self.elapsed if self.elapsed > 0 else 0.0
+        return (
+            f"⚙️ Processed {self.chunks} chunks from {self.sources} sources "
+            f"in {self.elapsed:.2f}s ({rate:.1f} chunks/s, {self.embedded} embedded)"
+        )
+
+
+class IngestPipeline:
+    """Ingest URLs into a vector store, upserting only new or changed chunks"""
+
+    def __init__(
+        self,
+        vector_store,
+        manifest,
+        loader=None,
+        text_splitter=None,
+        embeddings=None,
+        http_cache=None,
+        embed_batch_size=EMBED_BATCH_SIZE,
+        upsert_batch_size=UPSERT_BATCH_SIZE,
+        queue_depth=PIPELINE_QUEUE_DEPTH,
+    ):
+        self.vector_store = vector_store
+        self.manifest = manifest
+        # Pages already in the manifest are revalidated; a 304 skips them entirely
+        self.validators = _SourceValidators(http_cache if http_cache is not None else HttpCache(), manifest)
+        self.loader = loader or AsyncWebLoader(cache=self.validators)
+        # Documents may be embedded by a different engine than queries (see parallel_embeddings)
+        self.embeddings = embeddings or vector_store.embeddings
+        self.text_splitter = text_splitter or RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            # Lets context packing merge neighbouring chunks by position
+            add_start_index=True,
+        )
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.queue_depth = queue_depth
+        self.stats = PipelineStats()
+
+    def run(self, urls):
+        """Run the pipeline over `urls` and return the combined SyncReport"""
+        urls = list(dict.fromkeys(urls))
+        self.stats = PipelineStats()
+        self.validators.pending.clear()
+        self._stop = threading.Event()
+        self._errors = []
+
+        pages = queue.Queue(maxsize=self.queue_depth)
+        chunks = queue.Queue(maxsize=self.queue_depth)
+        points = queue.Queue(maxsize=self.queue_depth)
+        threads = [
+            threading.Thread(target=self._guard, args=(self._fetch, urls, pages), daemon=True),
+            threading.Thread(target=self._guard, args=(self._split, pages, chunks), daemon=True),
+            threading.Thread(target=self._guard, args=(self._embed, chunks, points), daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            # The upsert stage runs on the calling thread
+            self._guard(self._upsert, points, None)
+        finally:
+            # No-op after a clean run; unblocks the other stages otherwise
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self.manifest.save()
+            self.stats.finished = time.perf_counter()
+
+        if self._errors:
+            raise self._errors[0]
+        return self.stats.report
+
+    # -- plumbing -----------------------------------------------------------
+
+    def _guard(self, stage, inbox, outbox):
+        """Run a stage, stopping the whole pipeline if it fails"""
+        try:
+            stage(inbox, outbox)
+            if outbox is not None:
+                self._put(outbox, _END)
+        except _Stopped:
+            pass
+        except Exception as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _put(self, q, item):
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q):
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    # -- stages -------------------------------------------------------------
+
+    def _fetch(self, urls, outbox):
+        async def produce():
+            async for url, docs in self.loader.alazy_load(urls):
+                if docs or docs is None:
+                    # Blocking put off the event loop: other fetches keep going
+                    # until the loader's own bounded queue fills up
+                    await asyncio.to_thread(self._put, outbox, (url, docs))
+        asyncio.run(produce())
+        print(self.loader.stats.summary())
+
+    def _split(self, inbox, outbox):
+        while (item := self._get(inbox)) is not _END:
+            url, docs = item
+            if docs is None:
+                if not self.manifest.get(url):
+                    # Validators without a committed source: fetch it in full next time
+                    print(f"{url} not modified, but not in the manifest; skipped")
+                    self.validators.forget(url)
+                    continue
+                # Not modified since it was ingested: its chunks are all still stored
+                self._put(outbox, ("source", unchanged_source(url, self.manifest)))
+                self.stats.sources += 1
+                continue
+            with stage("split") as fields:
+                for doc in docs:
+                    doc.metadata["content_version"] = content_version(doc.page_content)
+                split_docs = self.text_splitter.split_documents(docs)
+                fields["chunks"] = len(split_docs)
+            self.stats.chunks += len(split_docs)
+            for source, source_chunks in group_by_source(split_docs).items():
+                plan = plan_source(source, source_chunks, self.manifest)
+                new_chunks = list(zip(plan.new_ids, plan.new_docs))
+                for start in range(0, len(new_chunks), self.embed_batch_size):
+                    self._put(outbox, ("chunks", new_chunks[start:start + self.embed_batch_size]))
+                self._put(outbox, ("source", plan))
+                self.stats.sources += 1
+
+    def _embed(self, inbox, outbox):
+        buffer = _Buffer(self.embed_batch_size)
+        while (item := self._get(inbox)) is not _END:
+            kind, payload = item
+            if kind == "chunks":
+                buffer.add(payload)
+            else:
+                buffer.mark(payload)
+            self._embed_ready(buffer.drain(), outbox)
+        self._embed_ready(buffer.drain(final=True), outbox)
+
+    def _embed_ready(self, ready, outbox):
+        for kind, payload in ready:
+            if kind == "batch":
+                texts = [doc.page_content for _, doc in payload]
+                with stage("embed", chunks=len(texts)):
+                    vectors = self.embeddings.embed_documents(texts)
+                self.stats.embedded += len(texts)
+                batch = [(point_id, doc, vector) for (point_id, doc), vector in zip(payload, vectors)]
+                self._put(outbox, ("points", batch))
+            else:
+                self._put(outbox, ("source", payload))
+
+    def _upsert(self, inbox, _):
+        buffer = _Buffer(self.upsert_batch_size)
+        while (item := self._get(inbox)) is not _END:
+            kind, payload = item
+            if kind == "points":
+                buffer.add(payload)
+            else:
+                buffer.mark(payload)
+            self._write_ready(buffer.drain())
+        self._write_ready(buffer.drain(final=True))
+
+    def _write_ready(self, ready):
+        for kind, payload in ready:
+            if kind == "batch":
+                ids, docs, vectors = zip(*payload)
+                with stage("upsert", chunks=len(ids)):
+                    upsert_vectors(self.vector_store, list(ids), list(docs), list(vectors))
+            else:
+                # All chunks of this source are stored: drop stale ones and commit
+                if payload.removed_ids:
+                    with stage("delete", chunks=len(payload.removed_ids)):
+                        self.vector_store.delete(ids=payload.removed_ids)
+                self.manifest.set(payload.source, payload.ids)
+                self.validators.commit(payload.source)
+                self.stats.report = self.stats.report + payload.report
@@ -1,18 +1,33 @@
-from pathlib import Path
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from qdrant_client import QdrantClient
-from langchain_qdrant import QdrantVectorStore  # Fixed import
-from langchain_google_genai import ChatGoogleGenerativeAI
+import time
+
+# Measured before any imports so the startup report covers them too
+_STARTED = time.perf_counter()
+
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnableParallel, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 import os
+import threading
 from dotenv import load_dotenv
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
+
+from config import (
+    COLLECTION_NAME,
+    EMBED_BATCH_SIZE,
+    MULTI_QUERY_EXPANSIONS,
+    QDRANT_URL,
+    RETRIEVAL_K,
+    VECTOR_BACKEND,
+)
+from context_packing import pack_context
+from embeddings import get_embeddings
+from ingest import SourceManifest
+from local_store import LocalVectorStore
+from metrics import MetricsCallbackHandler, configure_metrics, get_metrics, instrumented, stage
+from parallel_embeddings import close_ingest_pool, get_ingest_embeddings, ingest_batch_size
+from pipeline import IngestPipeline
+from retrieval import MultiQueryRetriever, generate_questions
+from semantic_cache import SemanticCache
+from web_loader import AsyncWebLoader
 
 
 load_dotenv()
@@ -20,26 +35,99 @@ load_dotenv()
 
 os.environ["GOOGLE_API_KEY"] = os.getenv("API_KEY", "")
 
+ANSWER_TEMPLATE = """You are an AI assistant specialized in providing accurate and helpful responses about mental health.
+    
+Context: {context}
+
+User Question: {question}
+
+Instructions:
+1. Use the provided context to give comprehensive advice on managing stress and mental health
+2. Be empathetic and supportive in your response
+3. Provide practical tips and techniques that can help
+4. If the context doesn't have enough specific information, provide general evidence-based advice
+5. Complete your response - don't cut it off midway
+
+Answer:"""
+
+# Mental health articles injected when the collection does not exist yet
+ARTICLE_URLS = [
+    "https://medlineplus.gov/howtoimprovementalhealth.html",
+    "https://www.mentalhealth.org.uk/explore-mental-health/publications/our-best-mental-health-tips",  # Adding an extra NIMH article
+]
+
+_qdrant_client = None
+
+def get_qdrant_client():
+    """Return the shared Qdrant client (QDRANT_URL may also be ":memory:")"""
+    global _qdrant_client
+    if _qdrant_client is None:
+        from qdrant_client import QdrantClient
+
+        _qdrant_client = QdrantClient(location=QDRANT_URL)
+    return _qdrant_client
+
+def collection_exists(collection_name):
+    """Check whether a collection exists in the configured vector backend"""
+    if VECTOR_BACKEND == "local":
+        return LocalVectorStore.exists(collection_name)
+    return get_qdrant_client().collection_exists(collection_name)
+
+def unseeded_urls(urls, collection_name=COLLECTION_NAME, check_collection=True):
+    """The URLs the manifest has no chunks of in `collection_name` (all of them if it doesn't exist).
+
+    The manifest only records a source once all its chunks are stored, so
+    an interrupted ingest is picked up again. `check_collection=False`
+    trusts the manifest alone and skips connecting to the vector store.
+    """
+    if check_collection and not collection_exists(collection_name):
+        return list(urls)
+    manifest = SourceManifest(collection_name)
+    return [url for url in urls if not manifest.get(url)]
+
+def open_vector_store(collection_name, embeddings):
+    """Open a collection in the configured backend (VECTOR_BACKEND), creating it if needed"""
+    if VECTOR_BACKEND == "local":
+        # Embedded memory-mapped index: no server, no HTTP hop per query
+        return LocalVectorStore(collection_name, embeddings)
+    
+    from langchain_qdrant import QdrantVectorStore
+    from qdrant_client import models
+
+    client = get_qdrant_client()
+    if not client.collection_exists(collection_name):
+        dimension = len(embeddings.embed_query("dimension probe"))
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=models.VectorParams(size=dimension, distance=models.Distance.COSINE),
+        )
+    
+    return QdrantVectorStore(
+        client=client,
+        collection_name=collection_name,
+        embedding=embeddings,
+        validate_collection_config=False,
+    )
+
+def get_llm():
+    """Gemini chat model (the client library is imported on first use)"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.3)
+
 def setup_rag_pipeline():
     """Initialize the RAG pipeline components"""
     
   
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    embeddings = get_embeddings()
 
-    client = QdrantClient(url="http://localhost:6333")
-    
- 
-    vector_store = QdrantVectorStore(
-        client=client,
-        collection_name="learning_langchain",
-        embedding=embeddings
-    )
+    vector_store = open_vector_store("learning_langchain", embeddings)
     
  
-    retriever = vector_store.as_retriever(search_kwargs={"k": 3})  # Retrieve top 3 documents
-    
     # 5. Initialize Gemini LLM
-    llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.3)
+    llm = get_llm()
+    
+    retriever = build_retriever(vector_store, llm)  # Retrieve top 3 documents
     
     # 6. Create prompt template
     template = """You are an AI assistant specialized in providing accurate and helpful responses about mental health.
@@ -60,227 +148,293 @@ Answer:"""
     prompt = ChatPromptTemplate.from_template(template)
     
     # 7. Create the RAG chain
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+    rag_chain = build_rag_chain(retriever, prompt, llm)
     
-    rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
+    return vector_store, retriever, rag_chain
+
+def build_retriever(vector_store, llm):
+    """Multi-query retriever: the query plus LLM-expanded questions, searched in one batch"""
+    question_generator = None
+    if MULTI_QUERY_EXPANSIONS > 0:
+        question_generator = lambda query: generate_questions(query, llm, n=MULTI_QUERY_EXPANSIONS)
+    
+    return MultiQueryRetriever(
+        vector_store=vector_store,
+        k=RETRIEVAL_K,
+        question_generator=question_generator,
+    )
+
+def format_docs(docs):
+    """Retrieved documents as prompt context: merged, deduplicated and within CONTEXT_TOKEN_BUDGET"""
+    return pack_context(docs).text
+
+def build_rag_chain(retriever, prompt, llm):
+    """Create a chain that retrieves once and returns {"docs", "question", "answer"}"""
+    answer_chain = (
+        RunnableLambda(lambda x: {"context": format_docs(x["docs"]), "question": x["question"]})
         | prompt
         | llm
         | StrOutputParser()
     )
     
-    return vector_store, retriever, rag_chain
+    # Retrieved docs are reused for the prompt instead of searching twice;
+    # streaming yields the docs first, then the answer token by token
+    return RunnableParallel(
+        docs=retriever,
+        question=RunnablePassthrough(),
+    ).assign(answer=answer_chain)
 
+@instrumented("scrape_article")
 def scrape_article(url):
     """Scrape article content from a URL"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        # Get text content
-        article_text = soup.get_text()
-        
-        # Clean up the text
-        lines = (line.strip() for line in article_text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = '\n'.join(chunk for chunk in chunks if chunk)
-        
-        return text
-    except Exception as e:
-        print(f"Error scraping {url}: {str(e)}")
+    docs = AsyncWebLoader().load([url])
+    if not docs:
         return None
+    return docs[0].page_content
 
 def load_urls(urls):
-    """Load documents from multiple URLs"""
-    all_docs = []
-    
-    for url in urls:
-        print(f"Loading {url}...")
-        
-        if url.endswith('.pdf'):
-            # For PDF URLs, use the PDF loader
-            from langchain_community.document_loaders import PyPDFLoader
-            loader = PyPDFLoader(url)
-            docs = loader.load()
-        else:
-            # For web pages, use scraped content
-            content = scrape_article(url)
-            if content:
-                # Create a document object manually
-                from langchain_core.documents import Document
-                domain = urlparse(url).netloc
-                doc = Document(
-                    page_content=content,
-                    metadata={"source": url, "domain": domain, "type": "web"}
-                )
-                docs = [doc]
-            else:
-                continue
-        
-        all_docs.extend(docs)
+    """Load documents from multiple URLs concurrently"""
+    print(f"Loading {len(urls)} URL(s)...")
+    loader = AsyncWebLoader()
+    all_docs = loader.load(urls)
+    print(loader.stats.summary())
     
     return all_docs
 
-def inject_documents(urls):
-    """Load and inject web documents into Qdrant"""
-    # Load documents from URLs
-    docs = load_urls(urls)
+@instrumented("inject_documents")
+def inject_documents(urls, response_cache=None):
+    """Stream web documents into the vector store (fetch → split → embed → upsert)"""
+    # Shared embedding cache: only chunks not seen before go through the model,
+    # on a process pool per EMBED_WORKERS
+    embeddings = get_ingest_embeddings()
+    hits, misses = embeddings.hits, embeddings.misses
+    
+    # A freshly created collection holds none of the chunks the manifest remembers
+    manifest = SourceManifest(COLLECTION_NAME)
+    if not collection_exists(COLLECTION_NAME):
+        # Saved now: if this ingest is cut short, the sources count as missing
+        manifest.reset()
+        manifest.save()
+    
+    # Create the collection if needed, then upsert only new/changed chunks
+    vector_store = open_vector_store(COLLECTION_NAME, get_embeddings())
+    pipeline = IngestPipeline(
+        vector_store,
+        manifest,
+        embeddings=embeddings,
+        embed_batch_size=ingest_batch_size(embeddings, EMBED_BATCH_SIZE),
+    )
+    try:
+        report = pipeline.run(urls)
+    finally:
+        # The workers each hold a model copy; don't keep them for the session
+        close_ingest_pool(embeddings)
     
-    if not docs:
+    if not pipeline.stats.sources:
         print("No documents loaded!")
         return
     
-    # Split documents into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-    )
-    split_docs = text_splitter.split_documents(documents=docs)
-    
-    # Initialize embeddings
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    
-    # Create vector store using QdrantVectorStore
-    vector_store = QdrantVectorStore.from_documents(
-        documents=split_docs,
-        embedding=embeddings,
-        url="http://localhost:6333",
-        collection_name="mental_health_articles"  # New collection name
-    )
-    
-    print(f"✅ Successfully injected {len(split_docs)} document chunks from {len(urls)} sources")
+    print(pipeline.stats.summary())
+    print(f"✅ Injected {pipeline.stats.sources} sources: {report.summary()}")
+    if response_cache is not None and (report.added or report.removed):
+        response_cache.invalidate()
+    print(f"🧠 Embedding cache: {embeddings.hits - hits} hits, {embeddings.misses - misses} newly embedded")
 
-def add_new_url(url, vector_store):
-    """Add a new URL to the existing vector store"""
-    docs = load_urls([url])
+@instrumented("add_new_url")
+def add_new_url(url, vector_store, response_cache=None):
+    """Add a new URL to the existing vector store; returns the SyncReport (None if it failed to load)"""
+    # Upsert new/changed chunks and drop the ones no longer on the page
+    manifest = SourceManifest(vector_store.collection_name)
+    embeddings = get_ingest_embeddings()
+    pipeline = IngestPipeline(
+        vector_store,
+        manifest,
+        embeddings=embeddings,
+        embed_batch_size=ingest_batch_size(embeddings, EMBED_BATCH_SIZE),
+    )
+    try:
+        report = pipeline.run([url])
+    finally:
+        close_ingest_pool(embeddings)
     
-    if not docs:
+    if not pipeline.stats.sources:
         print(f"Failed to load {url}")
-        return
-    
-    # Split document into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-    )
-    split_docs = text_splitter.split_documents(documents=docs)
+        return None
     
-    # Add to existing vector store
-    vector_store.add_documents(split_docs)
+    print(f"✅ Updated {url}: {report.summary()}")
     
-    print(f"✅ Successfully added {len(split_docs)} chunks from {url}")
+    # Cached answers may no longer reflect what the collection contains
+    if response_cache is not None and (report.added or report.removed):
+        response_cache.invalidate()
+    return report
 
-def generate_response(query: str, retriever, rag_chain):
-    """Generate response for a user query"""
-    
-    # 1. Retrieve relevant documents
-    relevant_docs = retriever.invoke(query)
-    
-    print(f"\n🔍 Found {len(relevant_docs)} relevant documents")
-    for i, doc in enumerate(relevant_docs):
+def print_sources(docs):
+    print(f"\n🔍 Found {len(docs)} relevant documents")
+    for i, doc in enumerate(docs):
         print(f"{i+1}. {doc.page_content[:100]}...\n")
+
+def generate_response(query: str, rag_chain, response_cache=None):
+    """Generate a response for a user query, streaming tokens as they arrive"""
+    start = time.perf_counter()
+    timings = {}
+    relevant_docs = []
+    answer_parts = []
+    
+    # 0. Same or near-identical question answered before?
+    if response_cache is not None:
+        with stage("response_cache_lookup"):
+            cached = response_cache.lookup(query)
+        if cached is not None:
+            timings["total"] = time.perf_counter() - start
+            print_sources(cached["docs"])
+            print(f"🤖 Assistant: {cached['answer']}")
+            print(f"\n⚡ Cached answer (similarity {cached['similarity']:.2f}) in {timings['total'] * 1000:.0f}ms")
+            return cached["answer"], cached["docs"], timings
+    
+    # Per-step timings (retriever, prompt, LLM, parser) go to the metrics registry
+    for chunk in rag_chain.stream(query, config={"callbacks": [MetricsCallbackHandler()]}):
+        # 1. Retrieved documents arrive first
+        if "docs" in chunk:
+            timings["retrieval"] = time.perf_counter() - start
+            relevant_docs = chunk["docs"]
+            print_sources(relevant_docs)
+            print("🤖 Assistant: ", end="", flush=True)
+        
+        # 2. Then the answer, token by token
+        if "answer" in chunk:
+            timings.setdefault("first_token", time.perf_counter() - start)
+            answer_parts.append(chunk["answer"])
+            print(chunk["answer"], end="", flush=True)
     
-    # 2. Generate response using RAG chain
-    response = rag_chain.invoke(query)
+    timings["total"] = time.perf_counter() - start
+    print(f"\n\n⏱️ First token after {timings.get('first_token', timings['total']):.2f}s, "
+          f"full answer in {timings['total']:.2f}s")
     
-    return response, relevant_docs
-
-def main():
-    # First, inject the mental health articles
-    urls = [
-        "https://medlineplus.gov/howtoimprovementalhealth.html",
-        "https://www.mentalhealth.org.uk/explore-mental-health/publications/our-best-mental-health-tips",  # Adding an extra NIMH article
-    ]
+    response = "".join(answer_parts)
+    if response_cache is not None:
+        response_cache.store(query, response, relevant_docs)
     
-    # Inject documents if not already done
+    return response, relevant_docs, timings
+
+class Warmup:
+    """Run `setup` on a background thread; `result()` waits for it to finish.
+
+    A daemon thread is used so quitting at the prompt never waits for a
+    model that is still loading; anything it ingests must be safe to cut
+    short (see unseeded_urls). Errors are re-raised from `result()`.
+    """
+
+    def __init__(self, setup):
+        self.elapsed = None
+        self.error = None
+        self._setup = setup
+        self._result = None
+        self._done = threading.Event()
+        threading.Thread(target=self._run, name="warmup", daemon=True).start()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self._result = self._setup()
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self):
+        if not self._done.is_set():
+            print("⏳ Still loading the models, one moment...")
+            self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self._result
+
+def seed_collection(urls, check_collection=True):
+    """Ingest the seed URLs the collection doesn't hold yet (a no-op after the first run)"""
     try:
-        # Use a new collection name to avoid mixing with your problem statements
-        client = QdrantClient(url="http://localhost:6333")
-        collection_exists = client.collection_exists("mental_health_articles")
-        
-        if not collection_exists:
+        missing = unseeded_urls(urls, check_collection=check_collection)
+        if missing:
             print("Creating new collection with mental health articles...")
-            inject_documents(urls)
+            inject_documents(missing, SemanticCache(get_embeddings(), namespace=COLLECTION_NAME))
     except Exception as e:
         print(f"Warning: Could not check/create collection: {e}")
+
+def warm_up(urls):
+    """Load the embedding model, connect to the vector store and build the RAG chain"""
+    embeddings = get_embeddings()
+    embeddings.embed_query("warm-up")  # first call loads the weights
     
-    # Initialize the RAG pipeline with the proper collection
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    client = QdrantClient(url="http://localhost:6333")
+    # Only does anything if the collection vanished since the manifest was written
+    seed_collection(urls)
     
-    vector_store = QdrantVectorStore(
-        client=client,
-        collection_name="mental_health_articles",  # Use the new collection
-        embedding=embeddings
-    )
+    # Answers to repeated questions are served from the semantic cache
+    response_cache = SemanticCache(embeddings, namespace=COLLECTION_NAME)
     
-    retriever = vector_store.as_retriever(search_kwargs={"k": 3})
+    # Initialize the RAG pipeline with the proper collection
+    vector_store = open_vector_store(COLLECTION_NAME, embeddings)  # Use the new collection
     
     # Initialize Gemini LLM
-    llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.3)
+    llm = get_llm()
+    
+    retriever = build_retriever(vector_store, llm)
     
     # Create prompt template
-    template = """You are an AI assistant specialized in providing accurate and helpful responses about mental health.
+    prompt = ChatPromptTemplate.from_template(ANSWER_TEMPLATE)
     
-Context: {context}
-
-User Question: {question}
-
-Instructions:
-1. Use the provided context to give comprehensive advice on managing stress and mental health
-2. Be empathetic and supportive in your response
-3. Provide practical tips and techniques that can help
-4. If the context doesn't have enough specific information, provide general evidence-based advice
-5. Complete your response - don't cut it off midway
-
-Answer:"""
+    # Create the RAG chain
+    rag_chain = build_rag_chain(retriever, prompt, llm)
+    
+    return vector_store, rag_chain, response_cache
 
-    prompt = ChatPromptTemplate.from_template(template)
+def main():
+    configure_metrics()
     
-    # Create the RAG chain
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+    # The first run seeds the collection in the foreground: quitting during a
+    # background ingest would leave it partly filled. Only the manifest is
+    # read here, so later startups don't wait for the vector store client.
+    seed_collection(ARTICLE_URLS, check_collection=False)
     
-    rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
+    # Models and the vector store load in the background while the user types
+    warmup = Warmup(lambda: warm_up(ARTICLE_URLS))
     
     # Interactive CLI
     print("🤖 AI Assistant ready! Commands:")
     print("  - Type your question")
     print("  - Type 'add <url>' to add a new article/website")
+    print("  - Type 'stats' to show per-stage timings")
     print("  - Type 'exit' to quit\n")
+    print(f"⚡ Prompt ready after {time.perf_counter() - _STARTED:.2f}s "
+          f"(models warming up in the background)\n")
     
     while True:
         user_input = input("👤 You: ").strip()
         
         if user_input.lower() == 'exit':
+            if warmup.done():
+                print(f"⏱️ Background warm-up took {warmup.elapsed:.2f}s")
+                if warmup.error is None:
+                    print(warmup.result()[2].summary())
             print("👋 Goodbye!")
             break
         
         if not user_input:
             continue
         
+        if user_input.lower() == 'stats':
+            print(get_metrics().summary())
+            continue
+        
         try:
+            vector_store, rag_chain, response_cache = warmup.result()
             if user_input.lower().startswith('add '):
                 url = user_input[4:].strip()
-                add_new_url(url, vector_store)
+                add_new_url(url, vector_store, response_cache)
             else:
-                response, docs = generate_response(user_input, retriever, rag_chain)
-                print(f"\n🤖 Assistant: {response}")
+                response, docs, timings = generate_response(user_input, rag_chain, response_cache)
             
         except Exception as e:
             print(f"❌ Error: {str(e)}")
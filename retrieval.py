@@ -0,0 +1,140 @@
+"""Multi-query retrieval: one batched embedding pass, one batched search, rank fusion"""
+import re
+from typing import Any, Callable, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.retrievers import BaseRetriever
+
+from metrics import instrumented, stage
+
+
+# Standard damping constant from the reciprocal rank fusion paper
+RRF_K = 60
+
+QUESTIONS_TEMPLATE = """Generate {n} distinct but related questions that would help expand understanding of the user's situation and find relevant mental health resources.
+
+User message: {query}
+
+Return only the questions, one per line, without numbering."""
+
+
+@instrumented("generate_questions")
+def generate_questions(query, llm, n=3):
+    """Ask the LLM for `n` related questions that expand the user's query"""
+    prompt = ChatPromptTemplate.from_template(QUESTIONS_TEMPLATE)
+    text = (prompt | llm | StrOutputParser()).invoke({"query": query, "n": n})
+
+    questions = []
+    for line in text.splitlines():
+        # Models like to number or bullet the list anyway
+        question = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip()
+        if question:
+            questions.append(question)
+    return questions[:n]
+
+
+def embed_queries(embeddings, queries):
+    """Embed all queries in a single forward pass"""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(queries)
+    return embeddings.embed_documents(queries)
+
+
+def search_batch(vector_store, vectors, k):
+    """Search the vector store for every vector in one request.
+
+    Returns one ranked list of (point_id, score, Document) per vector.
+    """
+    with stage("vector_search", queries=len(vectors)):
+        return _search_batch(vector_store, vectors, k)
+
+
+def _search_batch(vector_store, vectors, k):
+    if hasattr(vector_store, "search_batch"):
+        # Stores with their own batched search (LocalVectorStore)
+        return vector_store.search_batch(vectors, k)
+
+    from qdrant_client import models
+
+    requests = [
+        models.QueryRequest(
+            query=vector,
+            using=vector_store.vector_name or None,
+            limit=k,
+            with_payload=True,
+        )
+        for vector in vectors
+    ]
+    responses = vector_store.client.query_batch_points(
+        collection_name=vector_store.collection_name,
+        requests=requests,
+    )
+    return [
+        [
+            (point.id, point.score, _document_from_point(vector_store, point))
+            for point in response.points
+        ]
+        for response in responses
+    ]
+
+
+def _document_from_point(vector_store, point):
+    payload = point.payload or {}
+    metadata = dict(payload.get(vector_store.metadata_payload_key) or {})
+    metadata["_id"] = point.id
+    metadata["_collection_name"] = vector_store.collection_name
+    return Document(
+        page_content=payload.get(vector_store.content_payload_key, ""),
+        metadata=metadata,
+    )
+
+
+def reciprocal_rank_fusion(result_lists, k=RRF_K):
+    """Merge ranked (point_id, score, Document) lists into one deduplicated ranking"""
+    scores = {}
+    docs = {}
+    for results in result_lists:
+        for rank, (point_id, _, doc) in enumerate(results):
+            scores[point_id] = scores.get(point_id, 0.0) + 1.0 / (k + rank + 1)
+            docs.setdefault(point_id, doc)
+
+    fused = []
+    seen_content = set()
+    for point_id in sorted(scores, key=scores.get, reverse=True):
+        doc = docs[point_id]
+        # The same passage can live under several sources (mirrors, reposts)
+        if doc.page_content in seen_content:
+            continue
+        seen_content.add(doc.page_content)
+        doc.metadata["rrf_score"] = scores[point_id]
+        fused.append(doc)
+    return fused
+
+
+class MultiQueryRetriever(BaseRetriever):
+    """Retrieve with the user's query plus LLM-expanded questions.
+
+    All queries are embedded together, searched with a single batch
+    request and merged with reciprocal rank fusion, so searching four
+    queries costs roughly as much as searching one.
+    """
+
+    vector_store: Any
+    k: int = 3
+    fetch_k: int = 5
+    question_generator: Optional[Callable[[str], List[str]]] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        queries = [query]
+        if self.question_generator is not None:
+            queries.extend(self.question_generator(query))
+
+        vectors = embed_queries(self.vector_store.embeddings, queries)
+        # Never fewer candidates per query than documents asked for
+        results = search_batch(self.vector_store, vectors, max(self.fetch_k, self.k))
+        return reciprocal_rank_fusion(results)[:self.k]
@@ -0,0 +1,197 @@
+"""Semantic response cache: reuse answers for repeated or near-duplicate questions"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config import (
+    CACHE_DIR,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL,
+)
+
+
+class SemanticCache:
+    """Answers to previous questions, looked up by cosine similarity of the question.
+
+    Entries live in SQLite so they survive restarts, and are mirrored in an
+    in-memory matrix of normalised question vectors for the lookup itself.
+    Each namespace (normally the collection name) is cached separately and
+    should be invalidated whenever that collection changes.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        namespace,
+        path=os.path.join(CACHE_DIR, "semantic_cache.sqlite"),
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl=SEMANTIC_CACHE_TTL,
+    ):
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, "
+            "question TEXT NOT NULL, vector BLOB NOT NULL, answer TEXT NOT NULL, "
+            "sources TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._load()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        return (
+            f"📊 Response cache: {self.hits} hits, {self.misses} misses "
+            f"({self.hit_rate:.0%} hit rate, {len(self._ids)} entries)"
+        )
+
+    def lookup(self, question):
+        """Return the cached {question, answer, docs, similarity} for a question, or None"""
+        vector = self._normalise(self.embeddings.embed_query(question))
+        with self._lock:
+            self._expire()
+            if not self._ids:
+                self.misses += 1
+                return None
+
+            similarities = self._matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = self._ids[best]
+            row = self._conn.execute(
+                "SELECT question, answer, sources FROM responses WHERE id = ?", (entry_id,)
+            ).fetchone()
+            if row is None:
+                # Deleted by another process sharing the file (invalidate, eviction)
+                self._drop([best])
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE id = ?", (time.time(), entry_id)
+            )
+            self._conn.commit()
+            self.hits += 1
+            cached_question, answer, sources = row
+
+        return {
+            "question": cached_question,
+            "answer": answer,
+            "docs": [Document(**doc) for doc in json.loads(sources)],
+            "similarity": float(similarities[best]),
+        }
+
+    def store(self, question, answer, docs):
+        """Remember the answer (and its sources) for a question"""
+        vector = self._normalise(self.embeddings.embed_query(question))
+        sources = json.dumps(
+            [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs],
+            default=str,
+        )
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO responses "
+                "(namespace, question, vector, answer, sources, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.namespace, question, vector.tobytes(), answer, sources, now, now),
+            )
+            self._ids.append(cursor.lastrowid)
+            self._created.append(now)
+            if self._matrix.size:
+                self._matrix = np.vstack([self._matrix, vector[None, :]])
+            else:
+                self._matrix = vector[None, :]
+            self._evict()
+            self._conn.commit()
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the collection changed"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE namespace = ?", (self.namespace,))
+            self._conn.commit()
+            self._reset_index()
+
+    # -- internals ----------------------------------------------------------
+
+    @staticmethod
+    def _normalise(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _reset_index(self):
+        self._ids = []
+        self._created = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def _load(self):
+        with self._lock:
+            self._reset_index()
+            self._expire_rows(time.time() - self.ttl)
+            rows = self._conn.execute(
+                "SELECT id, vector, created FROM responses WHERE namespace = ? ORDER BY id",
+                (self.namespace,),
+            ).fetchall()
+            if rows:
+                self._ids = [row[0] for row in rows]
+                self._created = [row[2] for row in rows]
+                self._matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+
+    def _expire_rows(self, cutoff):
+        self._conn.execute(
+            "DELETE FROM responses WHERE namespace = ? AND created < ?",
+            (self.namespace, cutoff),
+        )
+        self._conn.commit()
+
+    def _expire(self):
+        # Entries are appended in creation order, so expired ones form a prefix
+        cutoff = time.time() - self.ttl
+        expired = 0
+        while expired < len(self._created) and self._created[expired] < cutoff:
+            expired += 1
+        if expired:
+            # The same cutoff for the rows and the in-memory index
+            self._expire_rows(cutoff)
+            self._drop(list(range(expired)))
+
+    def _evict(self):
+        excess = len(self._ids) - self.max_entries
+        if excess <= 0:
+            return
+        rows = self._conn.execute(
+            "SELECT id FROM responses WHERE namespace = ? ORDER BY last_used LIMIT ?",
+            (self.namespace, excess),
+        ).fetchall()
+        stale = {row[0] for row in rows}
+        self._conn.executemany("DELETE FROM responses WHERE id = ?", [(i,) for i in stale])
+        self._drop([i for i, entry_id in enumerate(self._ids) if entry_id in stale])
+
+    def _drop(self, positions):
+        keep = sorted(set(range(len(self._ids))) - set(positions))
+        self._ids = [self._ids[i] for i in keep]
+        self._created = [self._created[i] for i in keep]
+        self._matrix = self._matrix[keep] if keep else np.zeros((0, 0), dtype=np.float32)
@@ -0,0 +1,235 @@
+"""Asyncio HTTP service: many concurrent users sharing one model, vector store and LLM.
+
+    python server.py [--host 127.0.0.1] [--port 8000]
+
+Endpoints (JSON in, JSON out):
+- POST /ask       {"question": "..."}  → {"answer", "sources", "cached", "elapsed_ms"}
+- POST /add_url   {"url": "..."}       → {"added", "unchanged", "removed"}
+- POST /emotion   {"text": "..."}      → emotion analysis (see assistant.emotion_detection)
+- GET  /metrics                        → Prometheus text (see metrics.py)
+- GET  /health
+
+LangChain chains and the ingestion pipeline are blocking, so requests run
+them on a shared worker pool. Query embeddings from concurrent requests
+are merged into one forward pass by MicroBatchingEmbeddings, and a
+semaphore caps the number of LLM calls in flight across all requests.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from config import COLLECTION_NAME, LLM_CONCURRENCY, SERVER_HOST, SERVER_PORT, SERVER_WORKERS
+from embeddings import MicroBatchingEmbeddings, get_embeddings
+from metrics import MetricsCallbackHandler, configure_metrics, get_metrics, stage
+from rag_with_gemini import (
+    ANSWER_TEMPLATE,
+    ARTICLE_URLS,
+    add_new_url,
+    build_rag_chain,
+    build_retriever,
+    get_llm,
+    inject_documents,
+    open_vector_store,
+    unseeded_urls,
+)
+from semantic_cache import SemanticCache
+
+
+class SourceLoadError(Exception):
+    """A URL to ingest could not be fetched or parsed (reported as 502)"""
+
+
+class RagService:
+    """Shared resources and the blocking work behind each endpoint"""
+
+    def __init__(self, llm=None, seed_urls=ARTICLE_URLS, use_response_cache=True, llm_concurrency=LLM_CONCURRENCY):
+        self.seed_urls = seed_urls
+        self.use_response_cache = use_response_cache
+        self.llm_slots = threading.BoundedSemaphore(llm_concurrency)
+        # Every ingest loads the one manifest file (shared by all collections) and
+        # rewrites it when done, so concurrent runs would lose each other's sources
+        # (ingestion runs one URL batch at a time)
+        self.ingest_lock = threading.Lock()
+        self._llm = llm
+        self.ready = False
+
+    def start(self):
+        """Load the model, open the collection (seeding it if new) and build the chain"""
+        self.embeddings = MicroBatchingEmbeddings(get_embeddings())
+        self.response_cache = None
+        if self.use_response_cache:
+            self.response_cache = SemanticCache(self.embeddings, namespace=COLLECTION_NAME)
+
+        with self.ingest_lock:
+            missing = unseeded_urls(self.seed_urls)
+            if missing:
+                inject_documents(missing, self.response_cache)
+        self.vector_store = open_vector_store(COLLECTION_NAME, self.embeddings)
+
+        llm = self._limit(self._llm or get_llm())
+        retriever = build_retriever(self.vector_store, llm)
+        prompt = ChatPromptTemplate.from_template(ANSWER_TEMPLATE)
+        self.rag_chain = build_rag_chain(retriever, prompt, llm)
+        self.ready = True
+
+    def _limit(self, llm):
+        """Wrap a chat model so at most `llm_concurrency` calls are in flight"""
+        def call(messages, config):
+            with self.llm_slots:
+                return llm.invoke(messages, config)
+
+        return RunnableLambda(call, name="llm_slot")
+
+    def ask(self, question):
+        start = time.perf_counter()
+        if self.response_cache is not None:
+            with stage("response_cache_lookup"):
+                cached = self.response_cache.lookup(question)
+            if cached is not None:
+                return {
+                    "answer": cached["answer"],
+                    "sources": _sources(cached["docs"]),
+                    "cached": True,
+                    "elapsed_ms": (time.perf_counter() - start) * 1000,
+                }
+
+        result = self.rag_chain.invoke(question, config={"callbacks": [MetricsCallbackHandler()]})
+        if self.response_cache is not None:
+            self.response_cache.store(question, result["answer"], result["docs"])
+        return {
+            "answer": result["answer"],
+            "sources": _sources(result["docs"]),
+            "cached": False,
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        }
+
+    def add_url(self, url):
+        with self.ingest_lock:
+            report = add_new_url(url, self.vector_store, self.response_cache)
+        if report is None:
+            raise SourceLoadError(f"Failed to load {url}")
+        return {"added": report.added, "unchanged": report.unchanged, "removed": report.removed}
+
+    def emotion(self, text):
+        from assistant import llm_emotion_detection, local_emotion_detection
+
+        # Only the LLM call needs a slot, not the local classifier
+        result = local_emotion_detection(text)
+        if result is not None:
+            return result
+        with self.llm_slots:
+            return llm_emotion_detection(text)
+
+
+def _sources(docs):
+    return [{"content": doc.page_content, "source": doc.metadata.get("source")} for doc in docs]
+
+
+SERVICE = web.AppKey("service", RagService)
+EXECUTOR = web.AppKey("executor", ThreadPoolExecutor)
+
+
+def _error(status, message):
+    return web.json_response({"error": message}, status=status)
+
+
+@web.middleware
+async def _errors_and_timing(request, handler):
+    # Route patterns, not raw paths, so unknown URLs do not create new stages
+    resource = request.match_info.route.resource
+    with stage(f"http:{resource.canonical if resource else 'unmatched'}"):
+        try:
+            return await handler(request)
+        except web.HTTPException:
+            raise
+        except SourceLoadError as e:
+            return _error(502, str(e))
+        except Exception as e:
+            return _error(500, f"{type(e).__name__}: {e}")
+
+
+async def _field(request, name):
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        body = None
+    value = body.get(name) if isinstance(body, dict) else None
+    if not isinstance(value, str) or not value.strip():
+        raise web.HTTPBadRequest(
+            text=json.dumps({"error": f"JSON body with a non-empty '{name}' is required"}),
+            content_type="application/json",
+        )
+    return value.strip()
+
+
+async def _run(request, function, *args):
+    """Run blocking service work on the shared worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(request.app[EXECUTOR], function, *args)
+
+
+async def ask(request):
+    question = await _field(request, "question")
+    return web.json_response(await _run(request, request.app[SERVICE].ask, question))
+
+
+async def add_url(request):
+    url = await _field(request, "url")
+    return web.json_response(await _run(request, request.app[SERVICE].add_url, url))
+
+
+async def emotion(request):
+    text = await _field(request, "text")
+    return web.json_response(await _run(request, request.app[SERVICE].emotion, text))
+
+
+async def metrics(request):
+    return web.Response(text=get_metrics().render(), content_type="text/plain")
+
+
+async def health(request):
+    return web.json_response({"ready": request.app[SERVICE].ready})
+
+
+def create_app(service=None, workers=SERVER_WORKERS):
+    """Build the aiohttp application; the service starts up with the app"""
+    app = web.Application(middlewares=[_errors_and_timing])
+    app[SERVICE] = service or RagService()
+    app[EXECUTOR] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-worker")
+
+    async def start(app):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(app[EXECUTOR], app[SERVICE].start)
+
+    async def stop(app):
+        app[EXECUTOR].shutdown(wait=False, cancel_futures=True)
+
+    app.on_startup.append(start)
+    app.on_cleanup.append(stop)
+    app.router.add_post("/ask", ask)
+    app.router.add_post("/add_url", add_url)
+    app.router.add_post("/emotion", emotion)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/health", health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    configure_metrics()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
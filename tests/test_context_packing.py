@@ -0,0 +1,101 @@
+from langchain_core.documents import Document
+
+from context_packing import MIN_OVERLAP_CHARS, Passage, _overlap, _trim, merge_chunks, pack_context
+from memory import count_tokens
+
+
+PAGE = " ".join(f"Sentence number {i} of the page." for i in range(40))
+
+
+def chunk(start, end, rank=0, version="v1", text=PAGE):
+    return Passage("doc", text[start:end], rank, start, version)
+
+
+def test_overlap_finds_shared_end_and_start():
+    a, b = PAGE[:300], PAGE[250:600]
+    assert _overlap(a, b) == 50
+    assert a + b[_overlap(a, b):] == PAGE[:600]
+
+
+def test_overlap_ignores_short_or_missing_matches():
+    assert _overlap(PAGE[:300], PAGE[300 - MIN_OVERLAP_CHARS + 5:600]) == 0
+    assert _overlap(PAGE[:300], PAGE[400:700]) == 0
+    assert _overlap("short", "short") == 0
+
+
+def test_overlap_contained_chunk():
+    assert _overlap(PAGE[:600], PAGE[100:300]) == 200
+
+
+def test_merge_by_offset_same_version():
+    passages = merge_chunks([chunk(250, 600, rank=1), chunk(0, 300, rank=2)])
+    assert len(passages) == 1
+    assert passages[0].text == PAGE[:600]
+    assert passages[0].rank == 1
+
+
+def test_merge_by_offset_bridges_separator_gap():
+    passages = merge_chunks([chunk(0, 300), chunk(301, 600)])
+    assert [p.text for p in passages] == [PAGE[:300] + "\n" + PAGE[301:600]]
+
+
+def test_merge_keeps_distant_chunks_apart():
+    passages = merge_chunks([chunk(0, 200), chunk(400, 600)])
+    assert sorted(p.text for p in passages) == sorted([PAGE[:200], PAGE[400:600]])
+
+
+def test_merge_stale_version_falls_back_to_text():
+    # The page gained a prefix; the unchanged chunk kept its old offset
+    edited = "A new introduction was added. " * 10 + PAGE
+    shift = len(edited) - len(PAGE)
+    kept = chunk(0, 300, rank=0, version="old")
+    fresh = chunk(shift + 250, shift + 600, rank=1, version="new", text=edited)
+    passages = merge_chunks([kept, fresh])
+    assert [p.text for p in passages] == [PAGE[:600]]
+
+
+def test_merge_stale_version_without_overlap_is_not_spliced():
+    kept = chunk(400, 700, version="old")
+    fresh = chunk(0, 300, version="new", text="x" * 50 + PAGE)
+    passages = merge_chunks([kept, fresh])
+    assert sorted(p.text for p in passages) == sorted([kept.text, fresh.text])
+
+
+def test_merge_without_offsets_matches_text():
+    passages = merge_chunks([
+        Passage("doc", PAGE[250:600], 0),
+        Passage("doc", PAGE[:300], 1),
+    ])
+    assert [p.text for p in passages] == [PAGE[:600]]
+
+
+def test_pack_context_keeps_pdf_pages_apart():
+    page_1 = "alpha " * 150
+    page_2 = "beta " * 150
+    docs = [
+        Document(page_2[:300], metadata={"source": "a.pdf", "page": 2, "start_index": 0, "content_version": "p2"}),
+        Document(page_1[400:700], metadata={"source": "a.pdf", "page": 1, "start_index": 400, "content_version": "p1"}),
+    ]
+    packed = pack_context(docs, budget=10_000)
+    assert packed.passages == 2
+    assert packed.text.split("\n\n") == [page_2[:300].strip(), page_1[400:700].strip()]
+
+
+def test_trim_keeps_passages_within_budget():
+    texts = [PAGE[:400], PAGE[400:800]]
+    assert _trim(texts, count_tokens(texts[0]) + count_tokens(texts[1])) == texts
+
+
+def test_trim_cuts_last_passage_at_sentence_end():
+    first = PAGE[:400]
+    budget = count_tokens(first) + 60
+    packed = _trim([first, PAGE], budget)
+    assert packed[0] == first
+    assert packed[1].endswith(".")
+    assert PAGE.startswith(packed[1])
+    assert count_tokens(first) + count_tokens(packed[1]) <= budget
+
+
+def test_trim_drops_too_short_remainder():
+    first = PAGE[:400]
+    assert _trim([first, PAGE], count_tokens(first) + 10) == [first]
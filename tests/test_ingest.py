@@ -0,0 +1,55 @@
+from langchain_core.documents import Document
+
+from ingest import SourceManifest, chunk_id, plan_source, unchanged_source
+
+
+SOURCE = "https://example.com/page"
+
+
+def manifest(tmp_path):
+    return SourceManifest("test", path=str(tmp_path / "manifest.json"))
+
+
+def test_chunk_id_is_deterministic_per_source():
+    assert chunk_id(SOURCE, "text") == chunk_id(SOURCE, "text")
+    assert chunk_id(SOURCE, "text") != chunk_id(SOURCE, "other")
+    assert chunk_id(SOURCE, "text") != chunk_id("https://example.com/other", "text")
+
+
+def test_plan_new_source_adds_every_chunk(tmp_path):
+    plan = plan_source(SOURCE, [Document("a"), Document("b"), Document("a")], manifest(tmp_path))
+    assert plan.ids == [chunk_id(SOURCE, "a"), chunk_id(SOURCE, "b")]
+    assert plan.new_ids == plan.ids
+    assert [doc.page_content for doc in plan.new_docs] == ["a", "b"]
+    assert plan.removed_ids == []
+
+
+def test_plan_diffs_against_manifest(tmp_path):
+    store = manifest(tmp_path)
+    store.set(SOURCE, [chunk_id(SOURCE, "a"), chunk_id(SOURCE, "b")])
+    plan = plan_source(SOURCE, [Document("a"), Document("c")], store)
+    assert plan.new_ids == [chunk_id(SOURCE, "c")]
+    assert [doc.page_content for doc in plan.new_docs] == ["c"]
+    assert plan.removed_ids == [chunk_id(SOURCE, "b")]
+    report = plan.report
+    assert (report.added, report.unchanged, report.removed) == (1, 1, 1)
+
+
+def test_unchanged_source_keeps_manifest_ids(tmp_path):
+    store = manifest(tmp_path)
+    store.set(SOURCE, [chunk_id(SOURCE, "a")])
+    plan = unchanged_source(SOURCE, store)
+    assert plan.ids == [chunk_id(SOURCE, "a")]
+    assert plan.new_ids == plan.new_docs == plan.removed_ids == []
+
+
+def test_manifest_round_trip_keeps_other_collections(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    first = SourceManifest("first", path=path)
+    first.set(SOURCE, ["1"])
+    first.save()
+    second = SourceManifest("second", path=path)
+    second.set(SOURCE, ["2"])
+    second.save()
+    assert SourceManifest("first", path=path).get(SOURCE) == ["1"]
+    assert SourceManifest("second", path=path).get(SOURCE) == ["2"]
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+import local_store
+from local_store import LocalVectorStore
+
+
+VECTORS = np.random.default_rng(0).normal(size=(40, 8)).astype(np.float32)
+IDS = [f"p{i}" for i in range(len(VECTORS))]
+
+
+def store(tmp_path, **kwargs):
+    kwargs.setdefault("ann_min_rows", 0)
+    return LocalVectorStore("test", None, path=str(tmp_path / "test"), **kwargs)
+
+
+def fill(vector_store):
+    docs = [Document(f"doc {i}", metadata={"n": i}) for i in range(len(VECTORS))]
+    vector_store.upsert_vectors(IDS, docs, VECTORS)
+
+
+def top(vector_store, rows):
+    return [hits[0][0] for hits in vector_store.search_batch(VECTORS[rows], 1)]
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_search_finds_nearest(tmp_path, quantize):
+    vector_store = store(tmp_path, quantize=quantize)
+    fill(vector_store)
+    assert top(vector_store, [0, 7, 39]) == ["p0", "p7", "p39"]
+    point_id, score, doc = vector_store.search_batch(VECTORS[[7]], 1)[0][0]
+    assert score == pytest.approx(1.0, abs=1e-3)
+    assert doc.page_content == "doc 7" and doc.metadata["n"] == 7
+
+
+def test_delete_and_overwrite_survive_reopen(tmp_path):
+    vector_store = store(tmp_path)
+    fill(vector_store)
+    vector_store.delete(["p3"])
+    vector_store.upsert_vectors(["p5"], [Document("new 5")], VECTORS[[6]])
+
+    reopened = store(tmp_path)
+    assert len(reopened) == len(IDS) - 1
+    assert "p3" not in top(reopened, [3])
+    assert [doc.page_content for doc in reopened.get_by_ids(["p3", "p5"])] == ["new 5"]
+
+
+def test_ivf_search_matches_exact(tmp_path):
+    vector_store = store(tmp_path, ann_min_rows=10, nprobe=64)
+    fill(vector_store)
+    assert top(vector_store, [1, 20]) == ["p1", "p20"]
+    assert os.path.exists(tmp_path / "test" / "ivf.npz")
+
+
+def test_compaction_keeps_live_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_store, "_COMPACT_MIN_GARBAGE", 10)
+    vector_store = store(tmp_path, compact_fraction=0.3)
+    fill(vector_store)
+    vector_store.delete(IDS[:20])
+
+    assert len(vector_store._ids) == 20
+    with open(tmp_path / "test" / "log.jsonl", "rb") as log:
+        assert sum(1 for _ in log) == 20
+    assert top(vector_store, [25, 39]) == ["p25", "p39"]
+    assert top(store(tmp_path), [25, 39]) == ["p25", "p39"]
+
+
+def test_meta_without_vectors_opens_empty(tmp_path):
+    vector_store = store(tmp_path)
+    fill(vector_store)
+    os.remove(tmp_path / "test" / "vectors.f32")
+    reopened = store(tmp_path)
+    assert len(reopened) == 0
+    assert reopened.search_batch(VECTORS[[0]], 1) == [[]]
@@ -0,0 +1,36 @@
+from memory import ConversationMemory, count_tokens, cut_at_sentence
+
+
+SUMMARY = " ".join(f"The user mentioned worry number {i} about work." for i in range(30))
+
+
+def test_cut_at_sentence_keeps_short_text():
+    assert cut_at_sentence("Short summary", 50) == "Short summary"
+
+
+def test_cut_at_sentence_ends_at_sentence():
+    cut = cut_at_sentence(SUMMARY, 40)
+    assert cut.endswith("work.")
+    assert SUMMARY.startswith(cut)
+    assert count_tokens(cut) <= 40
+
+
+def test_cut_at_sentence_falls_back_to_word_boundary():
+    text = " ".join(["word"] * 200)
+    cut = cut_at_sentence(text, 20)
+    assert cut and set(cut.split()) == {"word"}
+    assert count_tokens(cut) <= 20
+
+
+def test_compact_cuts_overlong_summary_at_sentence():
+    memory = ConversationMemory(
+        [{"role": "system", "content": "prefix"}],
+        summarizer=lambda summary, turns, max_tokens: SUMMARY,
+        budget=120,
+        recent_turns=1,
+        summary_tokens=40,
+    )
+    for i in range(6):
+        memory.add_turn(f"question {i} " * 10, f"answer {i} " * 10, background=False)
+    assert memory.summary and memory.summary.endswith("work.")
+    assert count_tokens(memory.summary) <= 40
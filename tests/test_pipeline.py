@@ -0,0 +1,98 @@
+import pytest
+from langchain_core.documents import Document
+
+from ingest import SourceManifest
+from pipeline import IngestPipeline
+from web_loader import FetchStats, HttpCache
+
+
+URL = "https://example.com/page"
+TEXT = "Breathing exercises help with stress. " * 20
+
+
+class FakeLoader:
+    """Returns fixed pages (None = 304 Not Modified) and sends validators like AsyncWebLoader"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.cache = None
+        self.stats = FetchStats()
+
+    async def alazy_load(self, urls):
+        for url in urls:
+            docs = self.pages[url]
+            if docs is not None:
+                self.cache.put(url, '"v1"', None)
+            yield url, docs
+
+
+class FakeStore:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.points = {}
+
+    def upsert_vectors(self, ids, docs, vectors):
+        if self.fail:
+            raise RuntimeError("upsert failed")
+        self.points.update(zip(ids, docs))
+
+    def delete(self, ids=None):
+        for point_id in ids:
+            self.points.pop(point_id, None)
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+
+def pipeline(tmp_path, store, pages):
+    manifest = SourceManifest("test", path=str(tmp_path / "manifest.json"))
+    http_cache = HttpCache(path=str(tmp_path / "http_cache.sqlite"))
+    loader = FakeLoader(pages)
+    ingest = IngestPipeline(store, manifest, loader=loader, embeddings=FakeEmbeddings(), http_cache=http_cache)
+    loader.cache = ingest.validators
+    return ingest, manifest, http_cache
+
+
+def page():
+    return [Document(TEXT, metadata={"source": URL})]
+
+
+def test_stored_source_is_committed(tmp_path):
+    store = FakeStore()
+    ingest, manifest, http_cache = pipeline(tmp_path, store, {URL: page()})
+    report = ingest.run([URL])
+    assert report.added == len(store.points) > 0
+    assert sorted(manifest.get(URL)) == sorted(store.points)
+    assert SourceManifest("test", path=manifest.path).get(URL) == manifest.get(URL)
+    assert http_cache.get("test", URL) == {"etag": '"v1"', "last_modified": None}
+
+
+def test_failed_upsert_does_not_commit_source(tmp_path):
+    ingest, manifest, http_cache = pipeline(tmp_path, FakeStore(fail=True), {URL: page()})
+    with pytest.raises(RuntimeError):
+        ingest.run([URL])
+    assert manifest.get(URL) == []
+    assert SourceManifest("test", path=manifest.path).get(URL) == []
+    assert http_cache.get("test", URL) is None
+
+
+def test_not_modified_source_is_kept_only_if_committed(tmp_path):
+    store = FakeStore()
+    ingest, manifest, http_cache = pipeline(tmp_path, store, {URL: page()})
+    ingest.run([URL])
+    ids = manifest.get(URL)
+
+    ingest.loader.pages[URL] = None
+    report = ingest.run([URL])
+    assert (report.added, report.unchanged, report.removed) == (0, len(ids), 0)
+    assert manifest.get(URL) == ids
+
+    # Validators for a source the manifest does not hold are dropped
+    other = SourceManifest("other", path=str(tmp_path / "manifest.json"))
+    ingest = IngestPipeline(store, other, loader=ingest.loader, embeddings=FakeEmbeddings(), http_cache=http_cache)
+    http_cache.put("other", URL, '"v1"', None)
+    report = ingest.run([URL])
+    assert report.unchanged == 0 and other.get(URL) == []
+    assert http_cache.get("other", URL) is None
@@ -0,0 +1,33 @@
+import pytest
+from langchain_core.documents import Document
+
+from retrieval import reciprocal_rank_fusion
+
+
+def hit(point_id, text=None):
+    return (point_id, 0.0, Document(text or f"text {point_id}"))
+
+
+def test_fusion_ranks_by_summed_reciprocal_rank():
+    fused = reciprocal_rank_fusion([
+        [hit("a"), hit("b"), hit("c")],
+        [hit("b"), hit("c"), hit("a")],
+        [hit("b"), hit("a")],
+    ], k=60)
+    assert [doc.page_content for doc in fused] == ["text b", "text a", "text c"]
+    assert fused[0].metadata["rrf_score"] == pytest.approx(1 / 62 + 1 / 61 + 1 / 61)
+
+
+def test_fusion_keeps_first_document_per_id():
+    fused = reciprocal_rank_fusion([[hit("a", "first")], [hit("a", "second")]])
+    assert [doc.page_content for doc in fused] == ["first"]
+
+
+def test_fusion_drops_duplicate_content_under_other_ids():
+    fused = reciprocal_rank_fusion([[hit("a", "same"), hit("b", "same"), hit("c")]])
+    assert [doc.page_content for doc in fused] == ["same", "text c"]
+
+
+def test_fusion_of_nothing_is_empty():
+    assert reciprocal_rank_fusion([]) == []
+    assert reciprocal_rank_fusion([[], []]) == []
@@ -0,0 +1,85 @@
+import pytest
+from langchain_core.documents import Document
+
+import semantic_cache
+from semantic_cache import SemanticCache
+
+
+class FakeEmbeddings:
+    """Each known question points along its own axis; paraphrases are close to it"""
+
+    VECTORS = {
+        "stress": [1.0, 0.0, 0.0],
+        "how to handle stress": [0.95, 0.05, 0.0],
+        "sleep": [0.0, 1.0, 0.0],
+        "diet": [0.0, 0.0, 1.0],
+    }
+
+    def embed_query(self, text):
+        return self.VECTORS[text]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    return now
+
+
+def cache(tmp_path, **kwargs):
+    return SemanticCache(
+        FakeEmbeddings(), "test", path=str(tmp_path / "cache.sqlite"), threshold=0.9, **kwargs
+    )
+
+
+def test_hit_on_similar_question_and_miss_otherwise(tmp_path, clock):
+    responses = cache(tmp_path)
+    responses.store("stress", "Take a walk.", [Document("walking helps", metadata={"source": "a"})])
+
+    hit = responses.lookup("how to handle stress")
+    assert hit["question"] == "stress" and hit["answer"] == "Take a walk."
+    assert hit["docs"][0].metadata == {"source": "a"}
+    assert responses.lookup("sleep") is None
+    assert (responses.hits, responses.misses) == (1, 1)
+
+
+def test_entries_survive_reopen_and_invalidate(tmp_path, clock):
+    cache(tmp_path).store("stress", "Take a walk.", [])
+    responses = cache(tmp_path)
+    assert responses.lookup("stress")["answer"] == "Take a walk."
+    responses.invalidate()
+    assert responses.lookup("stress") is None
+    assert cache(tmp_path).lookup("stress") is None
+
+
+def test_expired_entries_miss(tmp_path, clock):
+    responses = cache(tmp_path, ttl=60)
+    responses.store("stress", "Take a walk.", [])
+    clock[0] += 30
+    responses.store("sleep", "Keep a routine.", [])
+    clock[0] += 40
+    assert responses.lookup("stress") is None
+    assert responses.lookup("sleep")["answer"] == "Keep a routine."
+    assert cache(tmp_path, ttl=60).lookup("stress") is None
+
+
+def test_eviction_drops_least_recently_used(tmp_path, clock):
+    responses = cache(tmp_path, max_entries=2)
+    responses.store("stress", "Take a walk.", [])
+    clock[0] += 1
+    responses.store("sleep", "Keep a routine.", [])
+    clock[0] += 1
+    responses.lookup("stress")
+    clock[0] += 1
+    responses.store("diet", "Eat regularly.", [])
+    assert responses.lookup("sleep") is None
+    assert responses.lookup("stress") is not None
+    assert responses.lookup("diet") is not None
+
+
+def test_row_deleted_by_another_process_is_a_miss(tmp_path, clock):
+    responses = cache(tmp_path)
+    responses.store("stress", "Take a walk.", [])
+    cache(tmp_path).invalidate()
+    assert responses.lookup("stress") is None
+    assert responses._ids == []
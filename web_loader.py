@@ -0,0 +1,296 @@
+"""Concurrent web/PDF loader with connection pooling, retries and HTTP caching"""
+import asyncio
+import codecs
+import io
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+import aiohttp
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from config import (
+    CACHE_DIR,
+    FETCH_CONCURRENCY,
+    FETCH_PER_HOST,
+    FETCH_RETRIES,
+    FETCH_TIMEOUT,
+)
+from metrics import instrumented, stage
+
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def html_to_text(html):
+    """Extract readable text from an HTML page"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    # Get text content
+    article_text = soup.get_text()
+
+    # Clean up the text
+    lines = (line.strip() for line in article_text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+@instrumented("parse_pdf")
+def pdf_to_documents(data, url):
+    """Split a PDF into one document per page"""
+    reader = PdfReader(io.BytesIO(data))
+    domain = urlparse(url).netloc
+    return [
+        Document(
+            page_content=page.extract_text() or "",
+            metadata={"source": url, "domain": domain, "type": "pdf", "page": number},
+        )
+        for number, page in enumerate(reader.pages)
+    ]
+
+
+@instrumented("clean_html")
+def html_to_documents(html, url):
+    """Wrap the text of an HTML page in a single document"""
+    content = html_to_text(html)
+    if not content:
+        return []
+    domain = urlparse(url).netloc
+    return [Document(
+        page_content=content,
+        metadata={"source": url, "domain": domain, "type": "web"}
+    )]
+
+
+class HttpCache:
+    """SQLite table of ETag/Last-Modified validators, one row per collection and URL.
+
+    Only the validators are kept, never the page: a page that comes back
+    304 Not Modified is already in that collection (the ingest manifest
+    holds its chunk IDs), so there is nothing to re-parse. Rows are written
+    by the ingest pipeline once a source is committed.
+    """
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "http_cache.sqlite")):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_validators ("
+            "collection TEXT NOT NULL, url TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "fetched REAL NOT NULL, PRIMARY KEY (collection, url))"
+        )
+        self._conn.commit()
+
+    def get(self, collection, url):
+        """Return {"etag", "last_modified"} for a URL of a collection, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified FROM http_validators WHERE collection = ? AND url = ?",
+                (collection, url),
+            ).fetchone()
+        return {"etag": row[0], "last_modified": row[1]} if row else None
+
+    def put(self, collection, url, etag, last_modified):
+        with self._lock:
+            if not etag and not last_modified:
+                # Nothing to revalidate with next time
+                self._conn.execute(
+                    "DELETE FROM http_validators WHERE collection = ? AND url = ?", (collection, url)
+                )
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO http_validators (collection, url, etag, last_modified, fetched) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (collection, url, etag, last_modified, time.time()),
+                )
+            self._conn.commit()
+
+
+@dataclass
+class FetchStats:
+    pages: int = 0
+    not_modified: int = 0
+    failed: int = 0
+    bytes_fetched: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    finished: float = 0.0
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def pages_per_second(self):
+        total = self.pages + self.not_modified
+        return total / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (
+            f"📥 Loaded {self.pages} pages ({self.not_modified} unchanged, {self.failed} failed), "
+            f"{self.bytes_fetched / 1024:.1f} KB in {self.elapsed:.2f}s "
+            f"({self.pages_per_second:.1f} pages/s)"
+        )
+
+
+class _RetryableStatus(Exception):
+    pass
+
+
+class AsyncWebLoader:
+    """Fetch and parse many URLs with bounded concurrency.
+
+    One aiohttp session (and so one pooled connector) is shared by all
+    workers. With a `cache` (an object with `get(url)` and
+    `put(url, etag, last_modified)`), the validators it returns for a URL
+    are sent as a conditional GET, and a 304 Not Modified yields None
+    instead of documents; the validators of every full response are handed
+    to `cache.put`. Without one, every URL is fetched in full.
+    """
+
+    def __init__(
+        self,
+        concurrency=FETCH_CONCURRENCY,
+        per_host=FETCH_PER_HOST,
+        timeout=FETCH_TIMEOUT,
+        retries=FETCH_RETRIES,
+        backoff=0.5,
+        cache=None,
+    ):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+        self.stats = FetchStats()
+
+    async def alazy_load(self, urls):
+        """Yield (url, documents) pairs as each URL finishes loading (None if not modified)"""
+        urls = list(urls)
+        self.stats = FetchStats()
+        if not urls:
+            return
+
+        todo = asyncio.Queue()
+        for url in urls:
+            todo.put_nowait(url)
+        # Bounded so that a slow consumer holds the fetchers back
+        done = asyncio.Queue(maxsize=self.concurrency)
+
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": USER_AGENT},
+        )
+        workers = [
+            asyncio.create_task(self._worker(session, todo, done))
+            for _ in range(min(self.concurrency, len(urls)))
+        ]
+        try:
+            for _ in urls:
+                yield await done.get()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await session.close()
+            self.stats.finished = time.perf_counter()
+
+    async def aload(self, urls):
+        """Load every URL and return the documents in input order"""
+        urls = list(urls)
+        by_url = {}
+        async for url, docs in self.alazy_load(urls):
+            by_url[url] = docs
+        return [doc for url in urls for doc in by_url.get(url) or []]
+
+    def load(self, urls):
+        return asyncio.run(self.aload(urls))
+
+    async def _worker(self, session, todo, done):
+        while True:
+            try:
+                url = todo.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                docs = await self._load_one(session, url)
+            except Exception as e:
+                print(f"Error loading {url}: {str(e)}")
+                self.stats.failed += 1
+                docs = []
+            await done.put((url, docs))
+
+    async def _load_one(self, session, url):
+        cached = self.cache.get(url) if self.cache is not None else None
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        with stage("fetch") as fields:
+            status, body, response_headers = await self._fetch(session, url, headers)
+            fields["bytes"] = len(body)
+        if status == 304 and cached:
+            self.stats.not_modified += 1
+            return None
+
+        self.stats.bytes_fetched += len(body)
+        content_type = response_headers.get("Content-Type", "")
+        if url.lower().endswith(".pdf") or "application/pdf" in content_type:
+            docs = await asyncio.to_thread(pdf_to_documents, body, url)
+        else:
+            html = body.decode(self._charset(content_type), errors="replace")
+            docs = await asyncio.to_thread(html_to_documents, html, url)
+
+        if self.cache is not None:
+            self.cache.put(url, response_headers.get("ETag"), response_headers.get("Last-Modified"))
+        self.stats.pages += 1
+        return docs
+
+    async def _fetch(self, session, url, headers):
+        """GET a URL, retrying transient failures with jittered exponential backoff"""
+        for attempt in range(self.retries + 1):
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status in RETRY_STATUSES and attempt < self.retries:
+                        raise _RetryableStatus(f"HTTP {response.status}")
+                    if response.status == 304:
+                        return response.status, b"", response.headers
+                    response.raise_for_status()
+                    return response.status, await response.read(), response.headers
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError, _RetryableStatus):
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+
+    @staticmethod
+    def _charset(content_type):
+        for part in content_type.split(";"):
+            name, _, value = part.strip().partition("=")
+            if name.lower() == "charset" and value:
+                try:
+                    return codecs.lookup(value.strip('"')).name
+                except LookupError:
+                    break
+        return "utf-8"